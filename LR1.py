@@ -1,20 +1,12 @@
-import pandas as pd
 from datetime import datetime
-import os
+from eventlog import EventLog, EventReader
 
 filename = 'filename.csv'
 
-# Проверка наличия файла и чтение, если он существует
-if os.path.isfile(filename):
-    df = pd.read_csv(filename)
-else:
-    df = pd.DataFrame(columns=['year', 'month', 'day', 'hour', 'minute', 'second'])
+# Строка дописывается в конец файла, сам файл не перечитывается и не переписывается
+with EventLog(filename, ['year', 'month', 'day', 'hour', 'minute', 'second']) as log:
+    now = datetime.now()
+    log.append(*now.strftime('%Y %m %d %H %M %S').split())
 
-now = datetime.now()
-
-new_row = now.strftime('%Y %m %d %H %M %S').split()
-df.loc[len(df)] = new_row
-
-df.to_csv(filename, index=False)
-
-print(df)
+# Only the end of the log is read, the whole file would make every run O(file size) again
+print(EventReader(filename).tail(10))
@@ -1,35 +1,33 @@
-import pandas as pd
-import ta
 import matplotlib.pyplot as plt
 from binance.client import Client
 from matplotlib.dates import DateFormatter
+from fetcher import KlineFetcher
+from kline_store import KlineStore
+from resample import Resampler
+from indicators import rsi_wilder_multi
+from charts import plot_line, show
 
-def fetch_binance_data(symbol, interval, start_time, end_time):
-    client = Client()
-    k_lines = client.get_historical_klines(
-        symbol=symbol,
-        interval=interval,
-        start_str=start_time,
-        end_str=end_time
-    )
-    return k_lines
+def load_klines(symbol, interval, start_time, end_time):
+    # Only 1m candles are downloaded, other intervals are built from them in the local store
+    store = KlineStore(client=KlineFetcher())
+    return Resampler(store).load(symbol, interval, start_time, end_time)
 
 def calculate_rsi(df, periods):
-    for period in periods:
-        rsi_indicator = ta.momentum.RSIIndicator(df['close'], window=period)
-        df[f'RSI_{period}'] = rsi_indicator.rsi()
+    rsi_values = rsi_wilder_multi(df['close'], periods)
+    for i, period in enumerate(periods):
+        df[f'RSI_{period}'] = rsi_values[:, i]
     return df
 
 def visualize_data(df, periods):
-    plt.figure(figsize=(14, 10))
+    fig = plt.figure(figsize=(14, 10))
     plt.subplot(len(periods) + 1, 1, 1)
-    plt.plot(df['time'], df['close'], label='Close Price')
+    plot_line(plt.gca(), df['time'], df['close'], label='Close Price')
     plt.title('Close Price')
     plt.ylabel('Price')
 
     for i, period in enumerate(periods):
         plt.subplot(len(periods) + 1, 1, i + 2)
-        plt.plot(df['time'], df[f'RSI_{period}'], label=f'RSI_{period}', color='purple')
+        plot_line(plt.gca(), df['time'], df[f'RSI_{period}'], label=f'RSI_{period}', color='purple')
         plt.title(f'RSI_{period}')
         plt.ylabel('RSI')
         plt.legend()
@@ -39,19 +37,14 @@ def visualize_data(df, periods):
     plt.gca().xaxis.set_major_formatter(date_form)
 
     plt.tight_layout()
-    plt.show()
+    show(fig)
 
 # Loading data
 symbol = "BTCUSDT"
 interval = Client.KLINE_INTERVAL_1MINUTE
 start_time = "1 day ago UTC"
 end_time = "now UTC"
-k_lines_data = fetch_binance_data(symbol, interval, start_time, end_time)
-
-# Creating DataFrame
-k_lines_df = pd.DataFrame(k_lines_data, columns=['time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-k_lines_df['time'] = pd.to_datetime(k_lines_df['time'], unit='ms')
-k_lines_df[['close', 'high', 'low', 'open']] = k_lines_df[['close', 'high', 'low', 'open']].astype(float)
+k_lines_df = load_klines(symbol, interval, start_time, end_time)
 
 # Calculation of indicators
 periods = [14, 27, 100]
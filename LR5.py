@@ -1,8 +1,13 @@
 import pandas as pd
-import ta
 from matplotlib import pyplot as plt
 from binance.client import Client
 from dataclasses import dataclass
+from kline_store import KlineStore
+from signals import cci_adx_signals
+from exits import SIDE_BUY, SIDE_SELL
+from instrument import stage
+from indicators import fused_indicators
+from charts import plot_line, plot_markers, show
 
 @dataclass
 class Signal:
@@ -16,60 +21,18 @@ class Signal:
     result: float
 
 def create_signals(k_lines):
-    signals = []
-    for i in range(len(k_lines)):
-        signal = None
-        take_profit_price = None
-        stop_loss_price = None
-        current_price = k_lines.iloc[i]['close']
-        cci = k_lines.iloc[i]['cci']
-        adx = k_lines.iloc[i]['adx']
-        
-        if cci is not None and adx is not None:
-            if cci < -100 and adx > 25:
-                signal = 'sell'
-            elif cci > 100 and adx > 25:
-                signal = 'buy'
+    return cci_adx_signals(k_lines, cci_long=100, cci_short=-100, adx_cond=25,
+                           take_prof_long=0.1, take_prof_short=0.1, stop_loss_long=0.02, stop_loss_short=0.02,
+                           signal_cls=Signal)
 
-            if signal == "buy":
-                stop_loss_price = round((1 - 0.02) * current_price, 1)
-                take_profit_price = round((1 + 0.1) * current_price, 1)
-            elif signal == "sell":
-                stop_loss_price = round((1 + 0.02) * current_price, 1)
-                take_profit_price = round((1 - 0.1) * current_price, 1)
-
-            signals.append(Signal(
-                k_lines.iloc[i]['time'],
-                'BTCUSDT',
-                100,
-                signal,
-                current_price,
-                take_profit_price,
-                stop_loss_price,
-                None
-            ))
-    return signals
-
-# Fetching data from Binance
-client = Client()
-k_lines = client.get_historical_klines(
-    symbol="BTCUSDT",
-    interval=Client.KLINE_INTERVAL_1MINUTE,
-    start_str="1 week ago UTC",
-    end_str="now UTC"
-)
-
-# Creating DataFrame
-k_lines = pd.DataFrame(k_lines,
-                       columns=['time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume',
-                                'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume',
-                                'ignore'])
-k_lines['time'] = pd.to_datetime(k_lines['time'], unit='ms')
-k_lines[['close', 'high', 'low', 'open']] = k_lines[['close', 'high', 'low', 'open']].astype(float)
+# Fetching data from Binance, only the candles after the last stored one are downloaded
+store = KlineStore(client=Client())
+k_lines = store.load("BTCUSDT", Client.KLINE_INTERVAL_1MINUTE, "1 week ago UTC", "now UTC")
 
 # Calculating indicators
-k_lines['adx'] = ta.trend.ADXIndicator(k_lines['high'], k_lines['low'], k_lines['close']).adx()
-k_lines['cci'] = ta.trend.CCIIndicator(k_lines['high'], k_lines['low'], k_lines['close']).cci()
+with stage('indicators'):
+    values = fused_indicators(k_lines['high'], k_lines['low'], k_lines['close'], names=('adx', 'cci'))
+    k_lines['adx'], k_lines['cci'] = values['adx'], values['cci']
 
 # Generating signals
 signals = create_signals(k_lines)
@@ -81,18 +44,16 @@ if signals:
 else:
     print("No signals generated.")
 
-plt.figure(figsize=(12, 6))
-plt.plot(k_lines['time'], k_lines['close'], label='BTCUSDT price')
+fig = plt.figure(figsize=(12, 6))
+plot_line(plt.gca(), k_lines['time'], k_lines['close'], label='BTCUSDT price')
 
-for signal in signals:
-    if signal.side == 'buy':
-        plt.scatter(signal.time, signal.entry, color='green', label='Buy signal', marker='^', s=100)
-    elif signal.side == 'sell':
-        plt.scatter(signal.time, signal.entry, color='red', label='Sell signal', marker='v', s=100)
+# One marker collection per side instead of a scatter call per signal
+plot_markers(plt.gca(), signals.time, signals.entry, signals.side == SIDE_BUY, color='green', label='Buy signal', marker='^', s=100)
+plot_markers(plt.gca(), signals.time, signals.entry, signals.side == SIDE_SELL, color='red', label='Sell signal', marker='v', s=100)
 
 plt.title('BTCUSDT price and signals')
 plt.xlabel('Time')
 plt.ylabel('Price')
-plt.legend()
+plt.legend(loc='upper left')
 plt.grid(True)
-plt.show()
+show(fig)
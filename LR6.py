@@ -1,8 +1,17 @@
+import asyncio
+import sys
 import pandas as pd
 import ta
 from binance import Client
 from dataclasses import dataclass
-from typing import List
+from kline_store import KlineStore
+from exits import resolve_signals
+from signals import cci_adx_signals
+from tradebook import TradeBook
+from run_cache import RunCache
+from portfolio import simulate
+from live import LiveStrategy, websocket_source, run_live
+from instrument import stage
 
 
 @dataclass
@@ -20,109 +29,74 @@ class Signal:
 
 def perform_backtesting(k_lines: pd.DataFrame):
     signals = create_signals(k_lines)
-    results = []
+    return TradeBook.from_exits(signals, resolve_signals(k_lines, signals))
 
-    # Creating index on time for quick lookup
-    time_index = pd.DatetimeIndex(k_lines['time'])
-    
-    for signal in signals:
-        start_index = time_index.get_loc(signal.time)
 
-        data_slice = k_lines.iloc[start_index:]
+def perform_portfolio_backtesting(k_lines: pd.DataFrame, max_positions=1, cooldown=0, capital=10_000.0,
+                                  position_size=0.1, fee=0.001, slippage=0.0005):
+    # Only the signals one account could actually trade, sized from its equity
+    return simulate(k_lines, create_signals(k_lines), max_positions=max_positions, cooldown=cooldown,
+                    capital=capital, position_size=position_size, fee=fee, slippage=slippage)
 
-        for candle_id, row in data_slice.iterrows():
-            high, low = row['high'], row['low']
-            if (signal.side == "sell" and low <= signal.take_profit) or (
-                    signal.side == "buy" and high >= signal.take_profit):
-                signal.result = signal.take_profit - signal.entry if signal.side == 'buy' else (
-                        signal.entry - signal.take_profit)
-                signal.closed_by = "TP"
-            elif (signal.side == "sell" and high >= signal.stop_loss) or (
-                    signal.side == "buy" and low <= signal.stop_loss):
-                signal.result = signal.stop_loss - signal.entry if signal.side == 'buy' else (
-                        signal.entry - signal.stop_loss)
-                signal.closed_by = "SL"
 
-            if signal.result is not None:
-                results.append(signal)
-                break
-    return results
+def calculate_pnl(trade_list: TradeBook):
+    return trade_list.pnl()
 
 
-def calculate_pnl(trade_list: List[Signal]):
-    return sum(trade.result for trade in trade_list)
+def profit_factor(trade_list: TradeBook):
+    return trade_list.profit_factor()
 
 
-def profit_factor(trade_list: List[Signal]):
-    total_profit = sum(trade.result for trade in trade_list if trade.result > 0)
-    total_loss = sum(trade.result for trade in trade_list if trade.result < 0)
-    return total_profit / -total_loss if total_loss != 0 else float('inf')
-
-
-def calculate_statistics(trade_list: List[Signal]):
+def calculate_statistics(trade_list: TradeBook):
     print(f"Total P&L: {calculate_pnl(trade_list)}")
     print(f"Profit Factor: {profit_factor(trade_list)}")
 
 
 def create_signals(k_lines):
-    signals = []
-    for i, row in k_lines.iterrows():
-        current_price = row['close']
-        if row['cci'] < -100 and row['adx'] > 25:
-            side = 'sell'
-        elif row['cci'] > 100 and row['adx'] > 25:
-            side = 'buy'
-        else:
-            continue  # Skip if conditions are not met
-
-        sl_multiplier = 0.99 if side == "buy" else 1.01
-        tp_multiplier = 1.015 if side == "buy" else 0.985
-
-        signals.append(Signal(
-            time=row['time'],
-            asset='BTCUSDT',
-            quantity=100,
-            side=side,
-            entry=current_price,
-            take_profit=round(tp_multiplier * current_price, 1),
-            stop_loss=round(sl_multiplier * current_price, 1)
-        ))
-
-    return signals
+    return cci_adx_signals(k_lines, cci_long=100, cci_short=-100, adx_cond=25,
+                           take_prof_long=0.015, take_prof_short=0.015, stop_loss_long=0.01, stop_loss_short=0.01,
+                           signal_cls=Signal)
 
 
 def main():
-    client = Client()
-    k_lines = client.get_historical_klines(
-        symbol="BTCUSDT",
-        interval=Client.KLINE_INTERVAL_1MINUTE,
-        start_str="1 week ago UTC",
-        end_str="now UTC"
-    )
-
-    # Setup DataFrame
-    k_lines = pd.DataFrame(k_lines, columns=[
-        'time', 'open', 'high', 'low', 'close', 'volume',
-        'close_time', 'quote_asset_volume', 'number_of_trades',
-        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-
-    # Data Type Conversions
-    k_lines['time'] = pd.to_datetime(k_lines['time'], unit='ms')
-    for col in ['open', 'high', 'low', 'close']:
-        k_lines[col] = pd.to_numeric(k_lines[col], errors='coerce')
+    store = KlineStore(client=Client())
+    k_lines = store.load("BTCUSDT", Client.KLINE_INTERVAL_1MINUTE, "1 week ago UTC", "now UTC")
 
     # Adding Technical Indicators
-    adx_indicator = ta.trend.ADXIndicator(high=k_lines['high'], low=k_lines['low'], close=k_lines['close'], window=14, fillna=True)
-    k_lines['adx'] = adx_indicator.adx()
-    cci_indicator = ta.trend.CCIIndicator(high=k_lines['high'], low=k_lines['low'], close=k_lines['close'], window=20, constant=0.015)
-    k_lines['cci'] = cci_indicator.cci()
-
-    # Perform Backtesting
-    results = perform_backtesting(k_lines)
+    with stage('indicator.adx'):
+        adx_indicator = ta.trend.ADXIndicator(high=k_lines['high'], low=k_lines['low'], close=k_lines['close'], window=14, fillna=True)
+        k_lines['adx'] = adx_indicator.adx()
+    with stage('indicator.cci'):
+        cci_indicator = ta.trend.CCIIndicator(high=k_lines['high'], low=k_lines['low'], close=k_lines['close'], window=20, constant=0.015)
+        k_lines['cci'] = cci_indicator.cci()
+
+    # Perform Backtesting, unchanged klines and strategy give the stored trades back
+    results = RunCache().run(perform_backtesting, k_lines)
     for result in results:
-        print(f"Time: {result.time}, Asset: {result.asset}, Quantity: {result.quantity}, Side: {result.side}, "
-              f"Entry: {result.entry}, Take Profit: {result.take_profit}, Stop Loss: {result.stop_loss}, Result: {result.result}, Closed by: {result.closed_by}")
+        print_trade(result)
     calculate_statistics(results)
 
+    portfolio = perform_portfolio_backtesting(k_lines)
+    print(f"Portfolio: {portfolio.statistics()}")
+
+
+def print_trade(result):
+    print(f"Time: {result.time}, Asset: {result.asset}, Quantity: {result.quantity}, Side: {result.side}, "
+          f"Entry: {result.entry}, Take Profit: {result.take_profit}, Stop Loss: {result.stop_loss}, Result: {result.result}, Closed by: {result.closed_by}")
+
+
+def live(symbol="BTCUSDT", source=None):
+    # Warms ADX/CCI up on the last hour, then trades closed candles from the kline stream
+    store = KlineStore(client=Client())
+    strategy = LiveStrategy(create_signals, on_signal=print, on_exit=print_trade)
+    strategy.warm_up(store.load(symbol, Client.KLINE_INTERVAL_1MINUTE, "1 hour ago UTC", "now UTC"))
+    source = source or websocket_source(symbol, Client.KLINE_INTERVAL_1MINUTE)
+    try:
+        asyncio.run(run_live(source, strategy))
+    except KeyboardInterrupt:
+        pass
+    calculate_statistics(TradeBook.from_signals(strategy.closed))
+    print(f"Tick-to-signal latency: {strategy.latency.summary()}")
+
 if __name__ == "__main__":
-    main()
+    live() if "--live" in sys.argv else main()
@@ -0,0 +1,182 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+import pandas as pd
+import ta
+from indicator_cache import INDICATORS
+from indicators import fused_indicators, rsi_sma_multi, rsi_wilder_multi
+from klines import klines_frame, to_frame
+from pipeline import TREND_INDICATORS
+from signals import cci_adx_signals
+from strategies import run_strategies, variants
+from synthetic import synthetic_klines, synthetic_rows
+
+# Both scripts only run their main() when executed directly
+LR6 = importlib.import_module('LR6')
+ZALIKOVA = importlib.import_module('Залікова')
+
+# Building 10M get_historical_klines rows takes far more memory than the rest, parsing stops here
+PARSE_LIMIT = 1_000_000
+
+# LR_6.py draws these with uniform(), fixed here so every run does the same work
+LR_6_PARAMS = {'cci_long': 120, 'cci_short': -80, 'adx_cond': 22, 'take_prof_long': 0.006,
+               'take_prof_short': 0.004, 'stop_loss_long': 0.005, 'stop_loss_short': 0.003}
+
+# 50 strategies for the batch evaluator, in one pass they should cost about as much as one
+LR6_VARIANTS = variants('LR6', adx_cond=[15, 20, 25, 30, 35], cci_long=[50, 100], cci_short=[-50, -100, -150, -200, -250])
+
+
+def lr3_indicators(k):
+    return [ta.momentum.RSIIndicator(k['close']).rsi(),
+            ta.trend.CCIIndicator(k['high'], k['low'], k['close']).cci(),
+            ta.trend.MACD(k['close']).macd(),
+            ta.volatility.AverageTrueRange(k['high'], k['low'], k['close']).average_true_range(),
+            ta.trend.ADXIndicator(k['high'], k['low'], k['close']).adx()]
+
+
+def cci_adx_indicators(k):
+    return [ta.trend.ADXIndicator(k['high'], k['low'], k['close'], window=14, fillna=True).adx(),
+            ta.trend.CCIIndicator(k['high'], k['low'], k['close'], window=20, constant=0.015).cci()]
+
+
+def trend_indicators(k):
+    return [INDICATORS[name](k, window) for name, window in TREND_INDICATORS]
+
+
+def quiet(func):
+    # calculate_statistics prints its results
+    def run(*args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args)
+    return run
+
+
+def prepare(n, seed):
+    """Inputs of every stage, each one made by the stage before it outside the timing."""
+    array = synthetic_klines(n, seed)
+    cci_adx = to_frame(array)
+    cci_adx['adx'], cci_adx['cci'] = cci_adx_indicators(cci_adx)
+    trend = to_frame(array)
+    for (name, _), values in zip(TREND_INDICATORS, trend_indicators(trend)):
+        trend[name] = values
+    trend['symbol'] = 'BTCUSDT'
+    return {
+        'rows': synthetic_rows(array) if n <= PARSE_LIMIT else None,
+        'frame': to_frame(array),
+        'cci_adx': cci_adx,
+        'trend': trend,
+        'cci_adx_trades': LR6.perform_backtesting(cci_adx),
+        'trend_trades': ZALIKOVA.perform_backtesting(trend),
+    }
+
+
+# (name, input from prepare, function) for the hot paths of each script
+BENCHMARKS = [
+    ('parse/klines_frame', 'rows', klines_frame),
+    ('indicators/LR2 rsi_sma_multi', 'frame', lambda k: rsi_sma_multi(k['close'], [14, 27, 100])),
+    ('indicators/LR3 ta', 'frame', lr3_indicators),
+    ('indicators/LR3 fused', 'frame', lambda k: fused_indicators(k['high'], k['low'], k['close'])),
+    ('indicators/LR3 fused numpy', 'frame', lambda k: fused_indicators(k['high'], k['low'], k['close'], jit=False)),
+    ('indicators/LR4 rsi_wilder_multi', 'frame', lambda k: rsi_wilder_multi(k['close'], [14, 27, 100])),
+    ('indicators/LR6 adx+cci', 'frame', cci_adx_indicators),
+    ('indicators/Залікова', 'frame', trend_indicators),
+    ('create_signals/LR5', 'cci_adx', lambda k: cci_adx_signals(k, 100, -100, 25, 0.1, 0.1, 0.02, 0.02)),
+    ('create_signals/LR6', 'cci_adx', LR6.create_signals),
+    ('create_signals/LR_6', 'cci_adx', lambda k: cci_adx_signals(k, **LR_6_PARAMS)),
+    ('create_signals/Залікова', 'trend', ZALIKOVA.create_signals),
+    ('perform_backtesting/LR6', 'cci_adx', LR6.perform_backtesting),
+    ('perform_backtesting/Залікова', 'trend', ZALIKOVA.perform_backtesting),
+    ('calculate_statistics/LR6', 'cci_adx_trades', quiet(LR6.calculate_statistics)),
+    ('calculate_statistics/Залікова', 'trend_trades', quiet(ZALIKOVA.calculate_statistics)),
+    ('strategies/registered', 'frame', run_strategies),
+    ('strategies/50 LR6 variants', 'frame', lambda k: run_strategies(k, LR6_VARIANTS)),
+]
+
+
+def measure(func, argument, repeat, min_time=0.05):
+    # Fast stages are looped until a sample takes min_time, otherwise timer noise dominates
+    start = time.perf_counter()
+    func(argument)
+    loops = max(1, math.ceil(min_time / max(time.perf_counter() - start, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(argument)
+        times.append((time.perf_counter() - start) / loops)
+    return times
+
+
+def run(sizes, repeat=3, seed=0, only=None):
+    results = []
+    cases = [case for case in BENCHMARKS if not only or any(part in case[0] for part in only)]
+    for n in sizes:
+        data = prepare(n, seed)
+        for name, key, func in cases:
+            if data[key] is None:
+                continue
+            times = measure(func, data[key], repeat)
+            best = min(times)
+            results.append({'name': name, 'candles': n, 'best': best, 'median': statistics.median(times),
+                            'ns_per_candle': best / n * 1e9})
+            print(f"{name:<34} {n:>10} candles  best {best * 1e3:10.2f} ms  {best / n * 1e9:8.1f} ns/candle")
+    return {
+        'meta': {
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'seed': seed, 'repeat': repeat,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.1):
+    """Benchmarks that got slower than the baseline by more than `tolerance`, as (name, candles, ratio)."""
+    before = {(r['name'], r['candles']): r['best'] for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        key = (r['name'], r['candles'])
+        if key not in before:
+            continue
+        ratio = r['best'] / before[key]
+        flag = 'REGRESSION' if ratio > 1 + tolerance else 'faster' if ratio < 1 - tolerance else ''
+        print(f"{r['name']:<34} {r['candles']:>10} candles  {ratio:6.2f}x baseline  {flag}")
+        if ratio > 1 + tolerance:
+            regressions.append((*key, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times the backtest hot paths on synthetic klines")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help="run benchmarks whose name contains one of these")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help="JSON from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.repeat, args.seed, args.only)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(current, file, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(current, json.load(file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
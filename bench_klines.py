@@ -0,0 +1,37 @@
+import time
+import tracemalloc
+import pandas as pd
+from klines import klines_frame
+
+COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore']
+
+
+def fake_payload(n):
+    start = 1_700_000_000_000
+    return [[start + i * 60_000, '30000.01', '30010.00', '29990.50', '30005.12', '1.2345',
+             start + i * 60_000 + 59_999, '37000.1', 12, '0.6', '18000.0', '0'] for i in range(n)]
+
+
+def current_approach(k_lines):
+    df = pd.DataFrame(k_lines, columns=COLUMNS)
+    df['time'] = pd.to_datetime(df['time'], unit='ms')
+    df[['close', 'high', 'low', 'open']] = df[['close', 'high', 'low', 'open']].astype(float)
+    return df
+
+
+def measure(func, k_lines):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(k_lines)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    n = 1_000_000
+    k_lines = fake_payload(n)
+    for name, func in [('DataFrame + astype', current_approach), ('klines_frame', klines_frame)]:
+        elapsed, peak = measure(func, k_lines)
+        print(f"{name:<20} {n} candles: {elapsed:.2f} s, peak {peak / 2 ** 20:.1f} MiB")
@@ -0,0 +1,57 @@
+import os
+import numpy as np
+from matplotlib import pyplot as plt
+
+
+def m4(y, width) -> np.ndarray:
+    """Indices of the first, last, lowest and highest point in each of `width` buckets.
+
+    Drawn as a line these points cover the same pixels as the whole series (M4 aggregation).
+    Candles are evenly spaced in time, so the buckets split the index rather than the time axis.
+    NaN points are only kept as bucket ends, where they still break the line.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 4 * width:
+        return np.arange(n)
+    size = -(-n // width)
+    buckets = -(-n // size)
+    pad = buckets * size - n
+    nan = np.isnan(y)
+    low = np.concatenate([np.where(nan, np.inf, y), np.full(pad, np.inf)]).reshape(buckets, size)
+    high = np.concatenate([np.where(nan, -np.inf, y), np.full(pad, -np.inf)]).reshape(buckets, size)
+    start = np.arange(buckets) * size
+    picks = np.concatenate([start, np.minimum(start + size, n) - 1,
+                            start + low.argmin(axis=1), start + high.argmax(axis=1)])
+    return np.unique(np.minimum(picks, n - 1))
+
+
+def pixel_width(ax):
+    return max(1, int(ax.bbox.width))
+
+
+def plot_line(ax, x, y, **kwargs):
+    """ax.plot() of a long series downsampled to the width of the axes in pixels."""
+    y = np.asarray(y, dtype=np.float64)
+    index = m4(y, pixel_width(ax))
+    return ax.plot(np.asarray(x)[index], y[index], **kwargs)
+
+
+def plot_markers(ax, x, y, rows, **kwargs):
+    # All markers of one kind in a single collection, rows is a boolean mask or candle indices
+    rows = np.asarray(rows)
+    return ax.scatter(np.asarray(x)[rows], np.asarray(y, dtype=np.float64)[rows], **kwargs)
+
+
+def show(fig, output=None):
+    """Opens the figure in a window, or writes it to `output` without one.
+
+    The format follows the extension (.png, .svg, .pdf). CHART_OUTPUT sets the file for
+    scripts that do not pass one.
+    """
+    output = output or os.environ.get('CHART_OUTPUT')
+    if output:
+        fig.savefig(output)
+        plt.close(fig)
+    else:
+        plt.show()
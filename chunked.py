@@ -0,0 +1,124 @@
+import numpy as np
+from exits import EXIT_OPEN, Exits, ExitResolver
+from indicator_cache import INDICATORS, WARMUP_WINDOWS
+from klines import KLINE_DTYPE, to_frame
+from signals import SignalTable, trend_signals
+from tradebook import TradeBook
+
+# Candles per block in chunked mode, about 70 days of 1m klines
+BLOCK = 100_000
+
+SIGNAL_COLUMNS = ('side', 'entry', 'take_profit', 'stop_loss')
+
+
+def kline_blocks(arrays, size=BLOCK):
+    """Regroups KLINE_DTYPE arrays, such as KlineStore.iter_days, into blocks of `size` candles."""
+    pending, total = [], 0
+    for array in arrays:
+        while len(array):
+            take = min(size - total, len(array))
+            pending.append(array[:take])
+            total += take
+            array = array[take:]
+            if total == size:
+                yield np.concatenate(pending)
+                pending, total = [], 0
+    if total:
+        yield np.concatenate(pending)
+
+
+class ChunkedBacktest:
+    """Backtest fed one block of candles at a time, with the same trades as the in-memory run.
+
+    Indicators are computed over the block plus a tail of earlier candles long enough for
+    them to warm up, WARMUP_WINDOWS as in the indicator cache. The last window of a block
+    waits for the next one, ta leaves end effects there. Trades still open at the end of a
+    block are carried over and checked against the following blocks, so no candles are kept
+    for them.
+    """
+
+    def __init__(self, create_signals=trend_signals, indicators=(), symbol=None):
+        self.create_signals = create_signals
+        self.indicators = list(indicators)
+        self.symbol = symbol
+        window = max((w for _, w in self.indicators), default=0)
+        self.context = WARMUP_WINDOWS * window
+        self.holdback = window
+        self._tail = np.empty(0, dtype=KLINE_DTYPE)
+        # Rows at the start of the tail whose indicators are final
+        self._final = 0
+        self._done = 0
+        self._count = 0
+        self._parts = []
+        self._closed = []
+        self._pending = {name: np.empty(0) for name in ('id', *SIGNAL_COLUMNS)}
+
+    def feed(self, block):
+        self._tail = np.concatenate([self._tail, block])
+        self._process(last=False)
+
+    def _process(self, last):
+        buffer = self._tail
+        start = self._final
+        end = len(buffer) if last else max(start, len(buffer) - self.holdback)
+        if end > start:
+            k_lines = to_frame(buffer)
+            if self.symbol is not None:
+                k_lines['symbol'] = self.symbol
+            for name, window in self.indicators:
+                k_lines[name] = INDICATORS[name](k_lines, window)
+            part = k_lines.iloc[start:end].reset_index(drop=True)
+            self._resolve(self.create_signals(part), part)
+            self._done += end - start
+        cut = max(0, end - self.context)
+        self._tail = buffer[cut:].copy()
+        self._final = end - cut
+
+    def _resolve(self, signals, part):
+        # Open trades from earlier blocks are checked from the first candle of this one
+        ids = np.arange(self._count, self._count + len(signals))
+        self._count += len(signals)
+        self._parts.append((signals, self._done))
+        pending = self._pending
+        start = np.concatenate([np.zeros(len(pending['id']), dtype=np.int64), signals.index])
+        columns = {name: np.concatenate([pending[name], getattr(signals, name)]) for name in SIGNAL_COLUMNS}
+        ids = np.concatenate([pending['id'], ids]).astype(np.int64)
+
+        exits = ExitResolver(part['high'], part['low']).resolve(start, **columns)
+        closed = exits.exit_reason != EXIT_OPEN
+        self._closed.append((ids[closed], exits.exit_index[closed] + self._done,
+                             exits.exit_reason[closed], exits.result[closed]))
+        self._pending = {name: values[~closed] for name, values in [('id', ids), *columns.items()]}
+
+    def _signals(self) -> SignalTable:
+        if not self._parts:
+            return SignalTable(np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[ns]'),
+                               np.empty(0, dtype=np.int8), np.empty(0), np.empty(0), np.empty(0), self.symbol or '')
+        tables = [signals for signals, _ in self._parts]
+        first = tables[0]
+        asset = first.asset if isinstance(first.asset, str) else np.concatenate([s.asset for s in tables])
+        time = np.concatenate([s.time for s in tables]) if first.time is not None else None
+        return SignalTable(
+            np.concatenate([s.index + offset for s, offset in self._parts]), time,
+            *(np.concatenate([getattr(s, name) for s in tables]) for name in SIGNAL_COLUMNS),
+            asset, first.quantity, first.signal_cls,
+        )
+
+    def finish(self) -> TradeBook:
+        """Processes the held back candles and returns the trades in entry order."""
+        self._process(last=True)
+        self.signals = self._signals()
+        exit_index = np.full(self._count, -1, dtype=np.int64)
+        exit_reason = np.full(self._count, EXIT_OPEN, dtype=np.int8)
+        result = np.full(self._count, np.nan)
+        for ids, index, reason, values in self._closed:
+            exit_index[ids], exit_reason[ids], result[ids] = index, reason, values
+        self.exits = Exits(exit_index, exit_reason, result)
+        return TradeBook.from_exits(self.signals, self.exits)
+
+
+def chunked_backtest(blocks, create_signals=trend_signals, indicators=(), symbol=None) -> TradeBook:
+    backtest = ChunkedBacktest(create_signals, indicators, symbol)
+    for block in blocks:
+        backtest.feed(block)
+    return backtest.finish()
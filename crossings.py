@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+CROSS_DOWN = -1
+CROSS_UP = 1
+
+EVENT_DTYPE = np.dtype([('index', np.int64), ('indicator', np.int16), ('threshold', np.float64),
+                        ('direction', np.int8)])
+
+# Candles scanned at once, bounds the per-candle temporaries
+CHUNK = 1 << 20
+
+
+@dataclass
+class Crossings:
+    events: np.ndarray
+    names: list
+    length: int
+
+    def __len__(self):
+        return len(self.events)
+
+    def select(self, name, threshold=None, direction=None) -> np.ndarray:
+        """Candles where `name` crossed, optionally only `threshold` and `direction`."""
+        keep = self.events['indicator'] == self.names.index(name)
+        if threshold is not None:
+            keep &= self.events['threshold'] == threshold
+        if direction is not None:
+            keep &= self.events['direction'] == direction
+        return self.events['index'][keep]
+
+    def mask(self, name, threshold, direction) -> np.ndarray:
+        mask = np.zeros(self.length, dtype=bool)
+        mask[self.select(name, threshold, direction)] = True
+        return mask
+
+    def counts(self) -> pd.DataFrame:
+        """Number of events for every indicator, threshold and direction that has any."""
+        frame = pd.DataFrame(self.events)
+        frame['indicator'] = np.asarray(self.names, dtype=object)[self.events['indicator']]
+        return frame.groupby(['indicator', 'threshold', 'direction']).size().rename('events').reset_index()
+
+
+def _crossed(prev, current, thresholds, direction):
+    # Each step crosses a contiguous run of the sorted thresholds, returns its start and length
+    if direction == CROSS_DOWN:
+        # current < t <= prev
+        lo = np.searchsorted(thresholds, current, side='right')
+        hi = np.searchsorted(thresholds, prev, side='right')
+    else:
+        # prev <= t < current
+        lo = np.searchsorted(thresholds, prev, side='left')
+        hi = np.searchsorted(thresholds, current, side='left')
+    count = np.where(np.isnan(prev) | np.isnan(current), 0, np.maximum(hi - lo, 0))
+    return lo, count
+
+
+def _events(values, thresholds, direction, code, first):
+    lo, count = _crossed(values[:-1], values[1:], thresholds, direction)
+    steps = np.flatnonzero(count)
+    count = count[steps]
+    step = np.repeat(steps, count)
+    # Position of every event inside its step's run of thresholds
+    within = np.arange(len(step)) - np.repeat(np.cumsum(count) - count, count)
+    events = np.empty(len(step), dtype=EVENT_DTYPE)
+    events['index'] = first + 1 + step
+    events['indicator'] = code
+    events['threshold'] = thresholds[lo[step] + within]
+    events['direction'] = direction
+    return events
+
+
+def _per_indicator(thresholds, name):
+    values = thresholds.get(name, ()) if isinstance(thresholds, dict) else thresholds
+    return np.unique(np.asarray(values, dtype=np.float64))
+
+
+def scan_crossings(indicators, below=(), above=(), chunk=CHUNK) -> Crossings:
+    """Every threshold crossing of the indicators as a sparse list of events sorted by candle.
+
+    A `below` threshold t is crossed at candle i when the value drops under it,
+    x[i] < t <= x[i - 1], an `above` one when it rises over it, x[i - 1] <= t < x[i],
+    the buy and sell rules of LR3.py. Either is one list for every indicator or a dict
+    of lists by indicator name. The work per candle is a binary search in the sorted
+    thresholds, memory grows with the number of events, not candles times thresholds.
+    """
+    names = list(indicators)
+    parts = []
+    length = 0
+    for code, name in enumerate(names):
+        values = np.asarray(indicators[name], dtype=np.float64)
+        length = max(length, len(values))
+        for thresholds, direction in ((below, CROSS_DOWN), (above, CROSS_UP)):
+            thresholds = _per_indicator(thresholds, name)
+            if not len(thresholds):
+                continue
+            # Chunks overlap by one candle so the step between them is not lost
+            for lo in range(0, max(len(values) - 1, 0), chunk):
+                parts.append(_events(values[lo:lo + chunk + 1], thresholds, direction, code, lo))
+    events = np.concatenate(parts) if parts else np.empty(0, dtype=EVENT_DTYPE)
+    events = events[np.lexsort((events['direction'], events['threshold'], events['indicator'], events['index']))]
+    return Crossings(events, names, length)
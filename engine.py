@@ -0,0 +1,41 @@
+import numpy as np
+from live import Candle, LiveStrategy
+from tradebook import TradeBook
+
+# Rows converted to Python values at once when iterating a kline array
+CHUNK = 65536
+
+
+def array_candles(array):
+    """Closed candles from a KLINE_DTYPE array, which may be memory mapped."""
+    for lo in range(0, len(array), CHUNK):
+        for row in array[lo:lo + CHUNK].tolist():
+            yield Candle(row[0], row[1], row[2], row[3], row[4], row[5], row[6], True)
+
+
+def mmap_candles(path):
+    yield from array_candles(np.load(path, mmap_mode='r'))
+
+
+def store_candles(store, symbol, interval, start_str=None, end_str=None):
+    # Only one stored day is mapped at a time
+    for array in store.iter_days(symbol, interval, start_str, end_str):
+        yield from array_candles(array)
+
+
+def frame_candles(k_lines):
+    open_time = np.asarray(k_lines['time'], dtype='datetime64[ms]').astype(np.int64)
+    columns = [k_lines[name] for name in ('open', 'high', 'low', 'close', 'volume')]
+    for t, open_, high, low, close, volume in zip(open_time.tolist(), *(c.tolist() for c in columns)):
+        yield Candle(t, open_, high, low, close, volume, t, True)
+
+
+def replay(candles, strategy: LiveStrategy):
+    """Feeds candles to the strategy one at a time, the same way live trading does."""
+    for candle in candles:
+        strategy.on_candle(candle)
+    return strategy
+
+
+def event_backtest(candles, strategy: LiveStrategy) -> TradeBook:
+    return TradeBook.from_signals(replay(candles, strategy).closed)
@@ -0,0 +1,321 @@
+import io
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from kline_store import to_ms
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Lines read one at a time once a binary search has narrowed a CSV file down to this
+SCAN_BYTES = 64 * 1024
+
+# Columns LR1.py wrote before the event log, without the time
+TIME_PARTS = ('year', 'month', 'day', 'hour', 'minute', 'second')
+
+
+def _lock(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def rotated_files(path):
+    """The log and its rotated files that exist, oldest first."""
+    files = []
+    i = 1
+    while os.path.exists(f'{path}.{i}'):
+        files.append(f'{path}.{i}')
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+class EventLog:
+    """Append-only event log, each record stamped with the time in ms when it is written.
+
+    Records are CSV lines by default, or fixed-width binary records when a numpy dtype is
+    given, its first field being the int64 time. A record is one os.write() on a file opened
+    for appending, under a lock file shared by all writers, so threads and processes can log
+    to the same file. fsync runs every `fsync_every` records or `fsync_interval` seconds.
+    A file bigger than `max_bytes` is renamed to path.1 (the older ones to path.2 and so on,
+    up to `backups`) and a new one is started.
+    """
+
+    def __init__(self, path, columns=(), dtype=None, fsync_every=100, fsync_interval=1.0,
+                 max_bytes=64 * 2 ** 20, backups=5):
+        self.path = path
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        if self.dtype is not None and (self.dtype.names is None or self.dtype.names[0] != 'time'):
+            raise ValueError("The first field of a binary record has to be 'time'")
+        self.columns = list(self.dtype.names[1:]) if self.dtype is not None else list(columns)
+        self.header = ','.join(['time', *self.columns]).encode() + b'\n'
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._thread_lock = threading.Lock()
+        self._lock_fd = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        self._fd = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        if self.dtype is not None:
+            return
+        size = os.fstat(self._fd).st_size
+        if not size:
+            os.write(self._fd, self.header)
+            return
+        with open(self.path, 'rb') as file:
+            header = file.readline()
+        if header == self.header:
+            return
+        if header.rstrip(b'\r\n') == self.header[len(b'time,'):-1] and set(TIME_PARTS[:5]) <= set(self.columns):
+            os.close(self._fd)
+            self._migrate()
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        else:
+            raise ValueError(f"{self.path} has columns {header.strip().decode()}, "
+                             f"not {self.header.strip().decode()}")
+
+    def _migrate(self):
+        # A file from before the event log gets the time column, its rows were written with
+        # datetime.now(), so the time is built from year..second as local time
+        frame = pd.read_csv(self.path, dtype=str)
+        parts = frame[[name for name in TIME_PARTS if name in frame]].astype(int)
+        frame.insert(0, 'time', [int(datetime(*row).timestamp() * 1000) for row in parts.itertuples(index=False)])
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        frame.to_csv(tmp, index=False, lineterminator='\n')
+        os.replace(tmp, self.path)
+
+    def _current(self):
+        # Another writer may have rotated the file since we opened it
+        try:
+            if self._fd is not None and os.path.samestat(os.fstat(self._fd), os.stat(self.path)):
+                return
+        except FileNotFoundError:
+            pass
+        self._close_file()
+        self._open()
+
+    def _close_file(self):
+        if self._fd is not None:
+            self._sync()
+            os.close(self._fd)
+            self._fd = None
+
+    def _rotate(self):
+        self._close_file()
+        try:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f'{self.path}.{i}'):
+                    os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+            os.replace(self.path, f'{self.path}.1')
+        except PermissionError:
+            # Windows refuses while another process has the file open, the next append tries again
+            pass
+        self._open()
+
+    def _encode(self, now, values):
+        if self.dtype is not None:
+            return np.array([(now, *values)], dtype=self.dtype).tobytes()
+        return ','.join([str(now), *map(str, values)]).encode() + b'\n'
+
+    def append(self, *values):
+        """Writes one record with the current time followed by `values`, one per column."""
+        if len(values) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} values ({', '.join(self.columns)}), got {len(values)}")
+        with self._thread_lock:
+            _lock(self._lock_fd)
+            try:
+                self._current()
+                # The time is taken under the lock, so every file is in time order
+                now = time.time_ns() // 1_000_000
+                record = self._encode(now, values)
+                if self.max_bytes and os.fstat(self._fd).st_size + len(record) > self.max_bytes:
+                    self._rotate()
+                os.write(self._fd, record)
+            finally:
+                _unlock(self._lock_fd)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+        return now
+
+    def _sync(self):
+        if self._fd is not None and self._unsynced:
+            os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        with self._thread_lock:
+            self._sync()
+
+    def close(self):
+        with self._thread_lock:
+            self._close_file()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class EventReader:
+    """Reads an EventLog and its rotated files without loading them whole.
+
+    CSV files come back as DataFrames, binary ones as record arrays, pass the same dtype
+    as the writer for those.
+    """
+
+    def __init__(self, path, dtype=None):
+        self.path = path
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+
+    def files(self):
+        return rotated_files(self.path)
+
+    def _records(self, path):
+        # Memory-mapped, a record still being written at the end is left out
+        n = os.path.getsize(path) // self.dtype.itemsize
+        if not n:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(path, dtype=self.dtype, mode='r', shape=(n,))
+
+    def _frame(self, header, data):
+        return pd.read_csv(io.BytesIO(header + data))
+
+    @staticmethod
+    def _complete(file):
+        # Bytes up to the end of the last whole line
+        size = file.seek(0, os.SEEK_END)
+        while size:
+            file.seek(max(0, size - SCAN_BYTES))
+            block = file.read(size - file.tell())
+            end = block.rfind(b'\n')
+            if end >= 0:
+                return size - len(block) + end + 1
+            size -= len(block)
+        return 0
+
+    def tail(self, n=10):
+        """The last n records."""
+        if self.dtype is not None:
+            parts, left = [], n
+            for path in reversed(self.files()):
+                records = self._records(path)
+                parts.append(np.array(records[max(0, len(records) - left):]))
+                left -= len(parts[-1])
+                if left <= 0:
+                    break
+            return np.concatenate(parts[::-1]) if parts else np.empty(0, dtype=self.dtype)
+
+        chunks, left, header = [], n, None
+        for path in reversed(self.files()):
+            with open(path, 'rb') as file:
+                header = file.readline()
+                end = self._complete(file)
+                pos, left = self._last_lines(file, len(header), end, left)
+                file.seek(pos)
+                chunks.append(file.read(end - pos))
+            if left <= 0:
+                break
+        if header is None:
+            return pd.DataFrame()
+        return self._frame(header, b''.join(chunks[::-1]))
+
+    @staticmethod
+    def _last_lines(file, start, end, n):
+        # Offset of the last n lines in [start, end) and how many lines short of n the file was
+        if n <= 0:
+            return end, n
+        pos = end - 1
+        while pos > start:
+            lo = max(start, pos - SCAN_BYTES)
+            file.seek(lo)
+            block = file.read(pos - lo)
+            cut = len(block)
+            while n:
+                cut = block.rfind(b'\n', 0, cut)
+                if cut < 0:
+                    break
+                n -= 1
+            if not n:
+                return lo + cut + 1, 0
+            pos = lo
+        return start, n - (1 if end > start else 0)
+
+    @staticmethod
+    def _line_start(file, lo, hi, t):
+        # First line in [lo, hi) with time >= t, hi if there is none. lo is a line start.
+        while hi - lo > SCAN_BYTES:
+            file.seek((lo + hi) // 2)
+            file.readline()
+            pos = file.tell()
+            if pos >= hi:
+                break
+            line = file.readline()
+            if int(line.split(b',', 1)[0]) < t:
+                lo = file.tell()
+            else:
+                hi = pos
+        file.seek(lo)
+        while lo < hi:
+            line = file.readline()
+            if int(line.split(b',', 1)[0]) >= t:
+                return lo
+            lo += len(line)
+        return hi
+
+    def range(self, start=None, end=None):
+        """Records with start <= time < end, times as anything to_ms() accepts."""
+        start = to_ms(start) if start is not None else None
+        end = to_ms(end) if end is not None else None
+        if self.dtype is not None:
+            parts = []
+            for path in self.files():
+                records = self._records(path)
+                lo = np.searchsorted(records['time'], start, side='left') if start is not None else 0
+                hi = np.searchsorted(records['time'], end, side='left') if end is not None else len(records)
+                if lo < hi:
+                    parts.append(np.array(records[lo:hi]))
+            return np.concatenate(parts) if parts else np.empty(0, dtype=self.dtype)
+
+        chunks, header = [], None
+        for path in self.files():
+            with open(path, 'rb') as file:
+                header = file.readline()
+                first, size = len(header), self._complete(file)
+                lo = self._line_start(file, first, size, start) if start is not None else first
+                hi = self._line_start(file, lo, size, end) if end is not None else size
+                file.seek(lo)
+                chunks.append(file.read(hi - lo))
+        if header is None:
+            return pd.DataFrame()
+        return self._frame(header, b''.join(chunks))
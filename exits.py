@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from instrument import timed
+
+# Side and exit reason codes used by the array based backtesting code
+SIDE_BUY = 1
+SIDE_SELL = -1
+SIDES = {'buy': SIDE_BUY, 'sell': SIDE_SELL}
+
+EXIT_OPEN = 0
+EXIT_TP = 1
+EXIT_SL = 2
+EXIT_LABELS = {EXIT_OPEN: None, EXIT_TP: 'TP', EXIT_SL: 'SL'}
+
+# Fan-out of the block maximum tree and number of signals scanned at once
+BLOCK = 64
+BATCH = 16384
+
+
+@dataclass
+class Exits:
+    exit_index: np.ndarray
+    exit_reason: np.ndarray
+    result: np.ndarray
+
+
+def to_ns(times) -> np.ndarray:
+    return np.asarray(pd.to_datetime(times), dtype='datetime64[ns]').astype(np.int64)
+
+
+def start_indices(time, signal_time) -> np.ndarray:
+    # First candle with the signal's time, same as k_lines[k_lines['time'] == t].index[0]
+    return np.searchsorted(to_ns(time), to_ns(signal_time), side='left').astype(np.int64)
+
+
+def _build_levels(values: np.ndarray):
+    levels = [values]
+    while len(levels[-1]) > BLOCK:
+        level = levels[-1]
+        pad = -len(level) % BLOCK
+        if pad:
+            level = np.concatenate([level, np.full(pad, -np.inf)])
+        # fmax skips NaN, so a NaN candle never hides a hit in its block
+        levels.append(np.fmax.reduce(level.reshape(-1, BLOCK), axis=1))
+    return levels
+
+
+def _scan(values, pos, limit, threshold):
+    idx = pos[:, None] + np.arange(BLOCK)
+    valid = idx < limit[:, None]
+    hit = (values[np.minimum(idx, len(values) - 1)] >= threshold[:, None]) & valid
+    found = hit.any(axis=1)
+    return found, idx[np.arange(len(pos)), hit.argmax(axis=1)]
+
+
+def _first_at_least(levels, start, threshold):
+    # Index of the first value >= threshold at or after start, len(values) if there is none
+    n = len(levels[0])
+    first = np.full(len(start), n, dtype=np.int64)
+    pending = np.flatnonzero(start < n)
+    pos = start[pending]
+    hits = []
+
+    # Walk up the tree until the rest of the current block contains a hit
+    for depth, level in enumerate(levels):
+        if not len(pending):
+            break
+        limit = np.minimum((pos // BLOCK + 1) * BLOCK, len(level))
+        if depth == len(levels) - 1:
+            limit = np.full(len(pos), len(level), dtype=np.int64)
+        found, at = _scan(level, pos, limit, threshold[pending])
+        hits.append((depth, pending[found], at[found]))
+        pending, pos = pending[~found], pos[~found] // BLOCK + 1
+        keep = pos < len(levels[depth + 1]) if depth + 1 < len(levels) else np.zeros(len(pos), dtype=bool)
+        pending, pos = pending[keep], pos[keep]
+
+    # Walk back down to the first matching candle
+    for depth, queries, at in hits:
+        for level in reversed(levels[:depth]):
+            pos = at * BLOCK
+            limit = np.minimum(pos + BLOCK, len(level))
+            _, at = _scan(level, pos, limit, threshold[queries])
+        first[queries] = at
+    return first
+
+
+class ExitResolver:
+    """Finds TP/SL exits for many signals at once over fixed high/low arrays."""
+
+    @timed('exits.levels')
+    def __init__(self, high, low):
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self._high_levels = _build_levels(self.high)
+        self._low_levels = _build_levels(-self.low)
+
+    def _first_hit(self, start, up, threshold):
+        # up: the level is crossed by high >= threshold, otherwise by low <= threshold
+        first = np.full(len(start), len(self.high), dtype=np.int64)
+        for mask, levels, sign in ((up, self._high_levels, 1.0), (~up, self._low_levels, -1.0)):
+            queries = np.flatnonzero(mask)
+            if len(queries):
+                first[queries] = _first_at_least(levels, start[queries], sign * threshold[queries])
+        return first
+
+    @timed('exits')
+    def resolve(self, start, side, entry, take_profit, stop_loss) -> Exits:
+        start = np.asarray(start, dtype=np.int64)
+        side = np.asarray(side, dtype=np.int8)
+        entry = np.asarray(entry, dtype=np.float64)
+        take_profit = np.asarray(take_profit, dtype=np.float64)
+        stop_loss = np.asarray(stop_loss, dtype=np.float64)
+        buy = side == SIDE_BUY
+
+        tp_index = np.empty(len(start), dtype=np.int64)
+        sl_index = np.empty(len(start), dtype=np.int64)
+        for lo in range(0, len(start), BATCH):
+            part = slice(lo, lo + BATCH)
+            tp_index[part] = self._first_hit(start[part], buy[part], take_profit[part])
+            sl_index[part] = self._first_hit(start[part], ~buy[part], stop_loss[part])
+
+        # TP is checked before SL on the same candle
+        n = len(self.high)
+        by_tp = tp_index <= sl_index
+        exit_index = np.where(by_tp, tp_index, sl_index)
+        exit_price = np.where(by_tp, take_profit, stop_loss)
+        exit_reason = np.where(by_tp, EXIT_TP, EXIT_SL).astype(np.int8)
+        result = np.where(buy, exit_price - entry, entry - exit_price)
+
+        still_open = exit_index >= n
+        exit_index[still_open] = -1
+        exit_reason[still_open] = EXIT_OPEN
+        result[still_open] = np.nan
+        return Exits(exit_index, exit_reason, result)
+
+
+def resolve_exits(time, high, low, signal_time, side, entry, take_profit, stop_loss) -> Exits:
+    start = start_indices(time, signal_time)
+    return ExitResolver(high, low).resolve(start, side, entry, take_profit, stop_loss)
+
+
+def resolve_signals(k_lines: pd.DataFrame, signals) -> Exits:
+    if hasattr(signals, 'take_profit'):
+        # A SignalTable already knows the candle each signal starts on
+        resolver = ExitResolver(k_lines['high'], k_lines['low'])
+        return resolver.resolve(signals.index, signals.side, signals.entry, signals.take_profit, signals.stop_loss)
+    return resolve_exits(
+        k_lines['time'], k_lines['high'], k_lines['low'],
+        [signal.time for signal in signals],
+        [SIDES[signal.side] for signal in signals],
+        [signal.entry for signal in signals],
+        [signal.take_profit for signal in signals],
+        [signal.stop_loss for signal in signals],
+    )
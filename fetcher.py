@@ -0,0 +1,207 @@
+import copy
+import threading
+import time
+import warnings
+import numpy as np
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from kline_store import to_ms
+from instrument import timed, count
+
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000,
+    '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000, '1w': 604_800_000,
+}
+
+# Request weight of one /api/v3/klines page of up to 1000 candles, and the default per-minute limit
+KLINES_WEIGHT = 2
+KLINES_PAGE = 1000
+WEIGHT_LIMIT = 1200
+
+
+class WeightLimiter:
+    """Token bucket over the Binance request weight, shared by all download threads."""
+
+    def __init__(self, limit=WEIGHT_LIMIT, period=60.0, clock=time.monotonic, sleep=time.sleep):
+        self.limit = limit
+        self.period = period
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(limit)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.limit, self._tokens + (now - self._updated) * self.limit / self.period)
+        self._updated = now
+
+    def acquire(self, weight=1):
+        # More than the bucket holds is taken a bucketful at a time as it refills
+        while weight > self.limit:
+            self._take(self.limit)
+            weight -= self.limit
+        self._take(weight)
+
+    def _take(self, weight):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+                wait = (weight - self._tokens) * self.period / self.limit
+            self._sleep(wait)
+
+    def observe(self, used_weight):
+        # The server's X-MBX-USED-WEIGHT-1M also counts requests made by other processes
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, self.limit - used_weight)
+
+
+def used_weight(source):
+    # Accepts a requests.Response or a python-binance Client, which keeps the last response
+    response = source if hasattr(source, 'status_code') else getattr(source, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('x-mbx-used-weight-1m') or headers.get('X-MBX-USED-WEIGHT-1M')
+    return int(value) if value is not None else None
+
+
+def continuity(k_lines, interval):
+    """Drop duplicate candles and report gaps as (last open_time before, next open_time) pairs."""
+    if not k_lines:
+        return k_lines, []
+    open_time = np.fromiter((k[0] for k in k_lines), dtype=np.int64, count=len(k_lines))
+    order = np.argsort(open_time, kind='stable')
+    open_time = open_time[order]
+    keep = np.concatenate([[True], np.diff(open_time) != 0])
+    open_time = open_time[keep]
+    step = INTERVAL_MS[interval]
+    gaps = [(int(open_time[i]), int(open_time[i + 1])) for i in np.flatnonzero(np.diff(open_time) > step)]
+    return [k_lines[i] for i in order[keep]], gaps
+
+
+class KlineFetcher:
+    """Downloads a kline range as concurrent 1000-candle chunks over one pooled session.
+
+    get_historical_klines has the python-binance signature, so a fetcher can be passed
+    wherever the scripts and KlineStore expect a Client.
+    """
+
+    def __init__(self, base_url='https://api.binance.com', session=None, max_workers=8, limiter=None,
+                 retries=5, backoff=0.5, timeout=10, sleep=time.sleep):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.limiter = limiter or WeightLimiter()
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._sleep = sleep
+        self.gaps = {}
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def chunks(self, interval, start_ms, end_ms):
+        size = INTERVAL_MS[interval] * KLINES_PAGE
+        return [(start, min(start + size - 1, end_ms)) for start in range(start_ms, end_ms + 1, size)]
+
+    def fetch_chunk(self, symbol, interval, start_ms, end_ms):
+        params = {'symbol': symbol, 'interval': interval, 'startTime': start_ms, 'endTime': end_ms,
+                  'limit': KLINES_PAGE}
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(KLINES_WEIGHT)
+            count('requests')
+            try:
+                response = self.session.get(f'{self.base_url}/api/v3/klines', params=params, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+                self._sleep(self.backoff * 2 ** attempt)
+                continue
+            weight = used_weight(response)
+            if weight is not None:
+                self.limiter.observe(weight)
+            if response.status_code in (418, 429):
+                # Rate limited, wait as long as the server asks and stop spending weight meanwhile
+                self.limiter.observe(self.limiter.limit)
+                retry_after = float(response.headers.get('Retry-After', self.backoff * 2 ** attempt))
+                if attempt == self.retries:
+                    response.raise_for_status()
+                self._sleep(retry_after)
+                continue
+            if response.status_code >= 500 and attempt < self.retries:
+                self._sleep(self.backoff * 2 ** attempt)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def stream(self, symbol, interval, start_ms, end_ms):
+        """Yields lists of klines in time order as soon as the chunks before them are done."""
+        chunks = self.chunks(interval, start_ms, end_ms)
+        done = {}
+        next_chunk = 0
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            futures = {executor.submit(self.fetch_chunk, symbol, interval, start, end): i
+                       for i, (start, end) in enumerate(chunks)}
+            for future in as_completed(futures):
+                done[futures[future]] = future.result()
+                while next_chunk in done:
+                    yield done.pop(next_chunk)
+                    next_chunk += 1
+
+    @timed('fetch.http')
+    def get_historical_klines(self, symbol, interval, start_str, end_str=None, limit=KLINES_PAGE):
+        start_ms = to_ms(start_str)
+        end_ms = to_ms(end_str) if end_str is not None else int(time.time() * 1000)
+        k_lines = [k for part in self.stream(symbol, interval, start_ms, end_ms) for k in part]
+        k_lines, gaps = continuity(k_lines, interval)
+        self.gaps[(symbol, interval)] = gaps
+        if gaps:
+            # Exchange outages leave real holes, but so would a page lost on the way
+            shown = '; '.join(f'{np.datetime64(after, "ms")} and {np.datetime64(before, "ms")}' for after, before in gaps[:5])
+            warnings.warn(f"{symbol} {interval}: klines missing between {shown}" + ('; ...' if len(gaps) > 5 else ''))
+        return k_lines
+
+
+class LimitedClient:
+    """A python-binance Client for one download, each page of get_historical_klines is
+    requested on its own once the shared limiter has its weight."""
+
+    def __init__(self, client, limiter):
+        # The client keeps the last response, a copy reads the weight of its own requests only
+        self.client = copy.copy(client)
+        if hasattr(self.client, 'response'):
+            self.client.response = None
+        self.limiter = limiter
+
+    def get_historical_klines(self, symbol, interval, start_str, end_str=None, limit=KLINES_PAGE):
+        start_ms = to_ms(start_str)
+        end_ms = to_ms(end_str) if end_str is not None else int(time.time() * 1000)
+        size = INTERVAL_MS[interval] * KLINES_PAGE
+        k_lines = []
+        for start in range(start_ms, end_ms + 1, size):
+            self.limiter.acquire(KLINES_WEIGHT)
+            count('requests')
+            k_lines += self.client.get_historical_klines(symbol=symbol, interval=interval, start_str=start,
+                                                         end_str=min(start + size - 1, end_ms), limit=KLINES_PAGE)
+            weight = used_weight(self.client)
+            if weight is not None:
+                self.limiter.observe(weight)
+        return k_lines
+
+
+def limited(client, limiter):
+    # A KlineFetcher already takes the weight of every chunk, it only has to use the shared limiter
+    if isinstance(client, KlineFetcher):
+        client = copy.copy(client)
+        client.limiter = limiter
+        client.gaps = {}
+        return client
+    return LimitedClient(client, limiter)
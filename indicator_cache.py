@@ -0,0 +1,125 @@
+import os
+import numpy as np
+import pandas as pd
+import ta
+from instrument import stage
+from kline_store import KlineStore, DAY_MS
+from klines import to_frame
+
+# Indicators as the scripts compute them, all take the kline DataFrame and a window
+INDICATORS = {
+    'ema': lambda k, w: ta.trend.EMAIndicator(k['close'], window=w).ema_indicator(),
+    'sma': lambda k, w: ta.trend.SMAIndicator(k['close'], window=w).sma_indicator(),
+    'vwma': lambda k, w: ta.volume.VolumeWeightedAveragePrice(k['high'], k['low'], k['close'], k['volume'], window=w).volume_weighted_average_price(),
+    'rsi': lambda k, w: ta.momentum.RSIIndicator(k['close'], window=w).rsi(),
+    'adx': lambda k, w: ta.trend.ADXIndicator(k['high'], k['low'], k['close'], window=w).adx(),
+    'cci': lambda k, w: ta.trend.CCIIndicator(k['high'], k['low'], k['close'], window=w).cci(),
+    'atr': lambda k, w: ta.volatility.AverageTrueRange(k['high'], k['low'], k['close'], window=w).average_true_range(),
+}
+
+ENTRY_DTYPE = np.dtype([('open_time', np.int64), ('value', np.float64)])
+
+# Recursive indicators (EMA, Wilder smoothing) forget their seed after this many windows
+WARMUP_WINDOWS = 50
+
+# Only these are extended in place, their seed is below rounding after the warm-up. Rolling
+# sums carry rounding from where they started, so the others are recomputed whole.
+EXTENDABLE = {'ema', 'rsi', 'adx', 'atr'}
+
+# The kline columns the indicators read
+PRICE_COLUMNS = ['high', 'low', 'close', 'volume']
+
+
+class IndicatorCache:
+    """Indicator values stored next to the kline partitions and evicted by least recent use.
+
+    An entry starts at the first stored candle of the UTC day the klines start in, so the
+    rolling "1 week ago" windows of the scripts reuse and extend one entry for the whole day.
+    The values are those of the indicator computed from that candle, a window that starts
+    later in the day gets them warmed up on the stored candles before it, cached or not.
+    """
+
+    def __init__(self, root='klines', max_bytes=2 ** 30):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _path(self, symbol, interval, indicator, window, first_open_time):
+        return os.path.join(self.root, symbol, interval, 'indicators',
+                            f'{indicator}_{window}_{first_open_time}.npy')
+
+    def _compute(self, k_lines, open_time, indicator, window):
+        entry = np.empty(len(k_lines), dtype=ENTRY_DTYPE)
+        entry['open_time'] = open_time
+        with stage(f'indicator.{indicator}'):
+            entry['value'] = np.asarray(INDICATORS[indicator](k_lines, window), dtype=np.float64)
+        return entry
+
+    def _extend(self, cached, k_lines, open_time, indicator, window):
+        # k_lines starts at the first cached row. The last window of cached rows is
+        # recomputed too, ta leaves end effects there.
+        keep = max(0, len(cached) - window)
+        start = max(0, keep - WARMUP_WINDOWS * window)
+        tail = self._compute(k_lines.iloc[start:].reset_index(drop=True), open_time[start:], indicator, window)
+        return np.concatenate([cached[:keep], tail[keep - start:]])
+
+    def get(self, symbol, interval, k_lines: pd.DataFrame, indicator, window) -> np.ndarray:
+        open_time = np.asarray(k_lines['time'], dtype='datetime64[ms]').astype(np.int64)
+        if not len(open_time):
+            return np.empty(0, dtype=np.float64)
+        # The stored candles of the day before k_lines, the entry starts at the first of them
+        before = KlineStore(self.root).read(symbol, interval, int(open_time[0]) // DAY_MS * DAY_MS, int(open_time[0]) - 1)
+        lead = len(before)
+        full_time = np.concatenate([before['open_time'], open_time])
+        path = self._path(symbol, interval, indicator, window, int(full_time[0]))
+        n = len(full_time)
+
+        cached = np.load(path) if os.path.exists(path) else None
+        if cached is not None and len(cached) >= n and cached['open_time'][lead] == open_time[0] \
+                and cached['open_time'][n - 1] == open_time[-1]:
+            os.utime(path)
+            return cached['value'][lead:n].copy()
+
+        if lead:
+            k_lines = pd.concat([to_frame(before)[PRICE_COLUMNS], k_lines[PRICE_COLUMNS]], ignore_index=True)
+        overlap = len(cached) if cached is not None else 0
+        if indicator in EXTENDABLE and 0 < overlap < n and np.array_equal(cached['open_time'], full_time[:overlap]):
+            entry = self._extend(cached, k_lines, full_time, indicator, window)
+        else:
+            entry = self._compute(k_lines, full_time, indicator, window)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp.npy'
+        np.save(tmp, entry)
+        os.replace(tmp, path)
+        self.evict()
+        return entry['value'][lead:].copy()
+
+    def add(self, symbol, interval, k_lines: pd.DataFrame, indicators):
+        for indicator, window in indicators:
+            k_lines[indicator] = self.get(symbol, interval, k_lines, indicator, window)
+        return k_lines
+
+    def _entries(self):
+        for directory, _, files in os.walk(self.root):
+            if os.path.basename(directory) == 'indicators':
+                for name in files:
+                    if name.endswith('.npy') and '.tmp' not in name:
+                        yield os.path.join(directory, name)
+
+    def evict(self):
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
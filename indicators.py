@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+from instrument import timed
+
+
+def _gains_losses(close):
+    close = np.asarray(close, dtype=np.float64)
+    deltas = np.diff(close, prepend=np.nan)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+    return gains, losses
+
+
+def _rsi(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+@timed('indicator.rsi')
+def rsi_sma_multi(close, periods) -> np.ndarray:
+    """calculate_rsi from LR2.py for every period at once, shape (len(close), len(periods))."""
+    gains, losses = _gains_losses(close)
+    n = len(gains)
+
+    # Rolling sums of every window come from one extended precision cumulative sum
+    cum_gains = np.concatenate([[0], np.cumsum(gains, dtype=np.longdouble)])
+    cum_losses = np.concatenate([[0], np.cumsum(losses, dtype=np.longdouble)])
+    count = np.arange(1, n + 1, dtype=np.float64)
+    avg_gain = np.empty((len(periods), n), dtype=np.float64)
+    avg_loss = np.empty((len(periods), n), dtype=np.float64)
+    for row, period in enumerate(periods):
+        head = min(period, n)
+        avg_gain[row, :head] = cum_gains[1:head + 1]
+        avg_loss[row, :head] = cum_losses[1:head + 1]
+        avg_gain[row, head:] = cum_gains[head + 1:] - cum_gains[1:n - head + 1]
+        avg_loss[row, head:] = cum_losses[head + 1:] - cum_losses[1:n - head + 1]
+        avg_gain[row] /= np.minimum(count, period)
+        avg_loss[row] /= np.minimum(count, period)
+    return _rsi(avg_gain, avg_loss).T
+
+
+@timed('indicator.rsi')
+def rsi_wilder_multi(close, periods) -> np.ndarray:
+    """ta.momentum.RSIIndicator for every period at once, shape (len(close), len(periods))."""
+    gains, losses = _gains_losses(close)
+    gains, losses = pd.Series(gains), pd.Series(losses)
+    result = np.empty((len(gains), len(periods)), dtype=np.float64)
+    for column, period in enumerate(periods):
+        ema_gain = gains.ewm(alpha=1 / period, min_periods=period, adjust=False).mean().to_numpy()
+        ema_loss = losses.ewm(alpha=1 / period, min_periods=period, adjust=False).mean().to_numpy()
+        result[:, column] = np.where(ema_loss == 0, 100, _rsi(ema_gain, ema_loss))
+    return result
+
+
+# Optional compiled kernel for fused_indicators, the same function runs as plain Python in tests
+try:
+    from numba import njit
+    _jit = njit(cache=True, error_model='numpy')
+except ImportError:
+    njit = None
+
+    def _jit(func):
+        return func
+
+FUSED_INDICATORS = ('rsi', 'cci', 'macd', 'atr', 'adx')
+
+
+def _ewm_alpha(com):
+    # pandas turns span and alpha into a center of mass and back, rounding included
+    return 1.0 / (1.0 + com)
+
+
+@_jit
+def _pairwise_sum(values, lo, hi):
+    # np.sum's order for up to 128 values, so window means round the way ta's do
+    n = hi - lo
+    if n < 8:
+        total = 0.0
+        for i in range(lo, hi):
+            total += values[i]
+        return total
+    r0, r1, r2, r3 = values[lo], values[lo + 1], values[lo + 2], values[lo + 3]
+    r4, r5, r6, r7 = values[lo + 4], values[lo + 5], values[lo + 6], values[lo + 7]
+    i = lo + 8
+    while i < hi - n % 8:
+        r0 += values[i]
+        r1 += values[i + 1]
+        r2 += values[i + 2]
+        r3 += values[i + 3]
+        r4 += values[i + 4]
+        r5 += values[i + 5]
+        r6 += values[i + 6]
+        r7 += values[i + 7]
+        i += 8
+    total = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+    while i < hi:
+        total += values[i]
+        i += 1
+    return total
+
+
+@_jit
+def _ewm_step(mean, x, alpha):
+    # One adjust=False step of pandas ewm().mean()
+    if mean != x:
+        mean = ((1.0 - alpha) * mean + alpha * x) / ((1.0 - alpha) + alpha)
+    return mean
+
+
+@_jit
+def _fused_kernel(high, low, close, rsi_window, rsi_alpha, cci_window, cci_constant,
+                  fast_alpha, slow_alpha, macd_window, atr_window, adx_window, out):
+    # One loop over the candles for all five indicators, rows of out as in FUSED_INDICATORS
+    n = len(close)
+    tr = np.empty(n)
+    pos = np.empty(n)
+    neg = np.empty(n)
+    typical = np.empty(n)
+    deviation = np.empty(cci_window)
+    directional = np.zeros(max(n - adx_window + 1, 0))
+    up_mean = down_mean = fast = slow = atr = adx = trs = dip = din = 0.0
+    # State of pandas' rolling mean, a running sum with separate compensation for adds and removes
+    total = add_error = remove_error = last = 0.0
+    count = negatives = repeats = 0
+
+    for j in range(n):
+        high_j, low_j, close_j = high[j], low[j], close[j]
+        if j == 0:
+            tr[j] = high_j - low_j
+            pos[j] = neg[j] = 0.0
+            up = down = 0.0
+        else:
+            prev_close = close[j - 1]
+            tr[j] = max(high_j - low_j, abs(high_j - prev_close), abs(low_j - prev_close))
+            up_move, down_move = high_j - high[j - 1], low[j - 1] - low_j
+            pos[j] = up_move if up_move > down_move and up_move > 0 else 0.0
+            neg[j] = down_move if down_move > up_move and down_move > 0 else 0.0
+            diff = close_j - prev_close
+            up = diff if diff > 0 else 0.0
+            down = -diff if diff < 0 else 0.0
+        typical[j] = (high_j + low_j + close_j) / 3.0
+
+        # RSI
+        if j == 0:
+            up_mean, down_mean = up, down
+        else:
+            up_mean = _ewm_step(up_mean, up, rsi_alpha)
+            down_mean = _ewm_step(down_mean, down, rsi_alpha)
+        if j < rsi_window - 1:
+            out[0, j] = np.nan
+        elif down_mean == 0:
+            out[0, j] = 100.0
+        else:
+            out[0, j] = 100 - (100 / (1 + up_mean / down_mean))
+
+        # CCI
+        if j >= cci_window:
+            x = typical[j - cci_window]
+            count -= 1
+            y = -x - remove_error
+            t = total + y
+            remove_error = t - total - y
+            total = t
+            if x < 0:
+                negatives -= 1
+        x = typical[j]
+        count += 1
+        y = x - add_error
+        t = total + y
+        add_error = t - total - y
+        total = t
+        if x < 0:
+            negatives += 1
+        repeats = repeats + 1 if x == last else 1
+        last = x
+        if j < cci_window - 1:
+            out[1, j] = np.nan
+        else:
+            sma = total / count
+            if repeats >= count:
+                sma = last
+            elif negatives == 0 and sma < 0:
+                sma = 0.0
+            elif negatives == count and sma > 0:
+                sma = 0.0
+            lo = j - cci_window + 1
+            mean = _pairwise_sum(typical, lo, j + 1) / cci_window
+            for k in range(cci_window):
+                deviation[k] = abs(typical[lo + k] - mean)
+            mad = _pairwise_sum(deviation, 0, cci_window) / cci_window
+            out[1, j] = (typical[j] - sma) / (cci_constant * mad)
+
+        # MACD line
+        if j == 0:
+            fast = slow = close_j
+        else:
+            fast = _ewm_step(fast, close_j, fast_alpha)
+            slow = _ewm_step(slow, close_j, slow_alpha)
+        out[2, j] = fast - slow if j >= macd_window - 1 else np.nan
+
+        # ATR
+        if j < atr_window - 1:
+            atr = 0.0
+        elif j == atr_window - 1:
+            atr = _pairwise_sum(tr, 0, atr_window) / atr_window
+        else:
+            atr = (atr * (atr_window - 1) + tr[j]) / float(atr_window)
+        out[3, j] = atr
+
+        # ADX
+        w = adx_window
+        if j >= w:
+            i = j - w
+            if j == w:
+                trs = _pairwise_sum(tr, 1, w + 1)
+                dip = _pairwise_sum(pos, 1, w + 1)
+                din = _pairwise_sum(neg, 1, w + 1)
+            else:
+                trs = trs - (trs / float(w)) + tr[j]
+                dip = dip - (dip / float(w)) + pos[j]
+                din = din - (din / float(w)) + neg[j]
+            di_pos = 100 * (dip / trs) if trs != 0 else 0.0
+            di_neg = 100 * (din / trs) if trs != 0 else 0.0
+            if di_pos + di_neg != 0:
+                directional[i] = 100 * abs((di_pos - di_neg) / (di_pos + di_neg))
+            if j == 2 * w - 1:
+                adx = _pairwise_sum(directional, 0, w) / w
+            elif j > 2 * w - 1:
+                adx = ((adx * (w - 1)) + directional[i]) / float(w)
+        out[4, j] = adx if j >= 2 * w - 1 else 0.0
+
+
+def _wilder(seed, values, window):
+    # x[i] = (x[i - 1] * (window - 1) + value) / window from the seed on, as an ewm
+    series = pd.Series(np.concatenate([[seed], values]))
+    return series.ewm(alpha=1 / window, adjust=False).mean().to_numpy()
+
+
+def _mean_deviation(typical, window, rows=65536):
+    # Rolling mean absolute deviation, a block of windows at a time to bound the temporary
+    result = np.full(len(typical), np.nan)
+    if len(typical) < window:
+        return result
+    windows = np.lib.stride_tricks.sliding_window_view(typical, window)
+    for lo in range(0, len(windows), rows):
+        block = windows[lo:lo + rows]
+        result[window - 1 + lo:window - 1 + lo + len(block)] = \
+            np.abs(block - block.mean(axis=1, keepdims=True)).mean(axis=1)
+    return result
+
+
+def _fused_arrays(high, low, close, names, rsi_window, cci_window, cci_constant,
+                  macd_fast, macd_slow, atr_window, adx_window):
+    # Array version of _fused_kernel, the Wilder recurrences go through pandas ewm
+    n = len(close)
+    prev_close = np.concatenate([[np.nan], close[:-1]])
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    result = {}
+    if 'rsi' in names:
+        result['rsi'] = rsi_wilder_multi(close, [rsi_window])[:, 0]
+    if 'cci' in names:
+        typical = (high + low + close) / 3.0
+        sma = pd.Series(typical).rolling(cci_window).mean().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['cci'] = (typical - sma) / (cci_constant * _mean_deviation(typical, cci_window))
+    if 'macd' in names:
+        series = pd.Series(close)
+        result['macd'] = (series.ewm(span=macd_fast, min_periods=macd_fast, adjust=False).mean()
+                          - series.ewm(span=macd_slow, min_periods=macd_slow, adjust=False).mean()).to_numpy()
+    if 'atr' in names:
+        atr = np.zeros(n)
+        if n >= atr_window:
+            atr[atr_window - 1:] = _wilder(tr[:atr_window].mean(), tr[atr_window:], atr_window)
+        result['atr'] = atr
+    if 'adx' in names:
+        w = adx_window
+        adx = np.zeros(n)
+        if n >= 2 * w:
+            up_move = np.diff(high, prepend=np.nan)
+            down_move = -np.diff(low, prepend=np.nan)
+            pos = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+            neg = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+            # Smoothed sums from candle w on, as averages, only their ratios are used
+            trs, dip, din = (_wilder(x[1:w + 1].sum() / w, x[w + 1:], w) for x in (tr, pos, neg))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                di_pos = np.where(trs != 0, 100 * (dip / trs), 0.0)
+                di_neg = np.where(trs != 0, 100 * (din / trs), 0.0)
+                total = di_pos + di_neg
+                directional = np.where(total != 0, 100 * np.abs((di_pos - di_neg) / total), 0.0)
+            adx[2 * w - 1:] = _wilder(directional[:w].mean(), directional[w:], w)
+        result['adx'] = adx
+    return result
+
+
+@timed('indicator.fused')
+def fused_indicators(high, low, close, names=FUSED_INDICATORS, rsi_window=14, cci_window=20, cci_constant=0.015,
+                     macd_fast=12, macd_slow=26, atr_window=14, adx_window=14, jit=None) -> dict:
+    """ta's RSI, CCI, MACD line, ATR and ADX for the same candles, float64 arrays by name.
+
+    True range, directional movement and typical price are computed once for all of them.
+    With numba installed (or jit=True) a compiled kernel makes one pass over the candles in
+    ta's order of operations; without it array operations give the same values to within
+    floating point rounding.
+    """
+    high, low, close = (np.ascontiguousarray(x, dtype=np.float64) for x in (high, low, close))
+    if jit is None:
+        jit = njit is not None
+    if not jit:
+        return _fused_arrays(high, low, close, names, rsi_window, cci_window, cci_constant,
+                             macd_fast, macd_slow, atr_window, adx_window)
+    if njit is None:
+        raise ImportError("jit=True needs numba")
+    out = np.empty((len(FUSED_INDICATORS), len(close)))
+    _fused_kernel(high, low, close, rsi_window, _ewm_alpha((1 - 1 / rsi_window) / (1 / rsi_window)),
+                  cci_window, cci_constant, _ewm_alpha((macd_fast - 1) / 2), _ewm_alpha((macd_slow - 1) / 2),
+                  max(macd_fast, macd_slow), atr_window, adx_window, out)
+    return {name: out[FUSED_INDICATORS.index(name)] for name in names}
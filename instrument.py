@@ -0,0 +1,230 @@
+import atexit
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import threading
+import time
+
+# Stage timers, counters and peak memory, off unless enable() is called or INSTRUMENT is set.
+# INSTRUMENT=metrics.json (or metrics.prom for the Prometheus text format) writes them at exit,
+# PROFILE_STAGE=<stage> also runs cProfile inside that stage only and writes PROFILE_OUTPUT.
+
+_enabled = False
+_stages = {}
+_counters = {}
+_active = []
+_lock = threading.Lock()
+_sampler = None
+_last_rss = 0
+_profile_stage = None
+_profiler = None
+_profiling = False
+_NULL = contextlib.nullcontext()
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def rss():
+    """Resident memory of the process in bytes, the peak so far where /proc is not available."""
+    if _PAGE_SIZE:
+        try:
+            with open('/proc/self/statm') as file:
+                return int(file.read().split()[1]) * _PAGE_SIZE
+        except OSError:
+            pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _Sampler(threading.Thread):
+    # Reads the memory in the background so stages only look at the last reading
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        global _last_rss
+        while not self.stopped.wait(self.interval):
+            _last_rss = rss()
+            with _lock:
+                for open_stage in _active:
+                    open_stage.peak = max(open_stage.peak, _last_rss)
+
+
+class _Stage:
+    __slots__ = ('name', 'start', 'peak', 'profiled')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        global _profiling
+        self.peak = _last_rss
+        with _lock:
+            _active.append(self)
+        self.profiled = _profiler is not None and self.name == _profile_stage and not _profiling
+        if self.profiled:
+            _profiling = True
+            _profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _profiling
+        elapsed = time.perf_counter() - self.start
+        if self.profiled:
+            _profiler.disable()
+            _profiling = False
+        peak = max(self.peak, _last_rss)
+        with _lock:
+            _active.remove(self)
+            record = _stages.setdefault(self.name, {'calls': 0, 'seconds': 0.0, 'peak_rss': 0})
+            record['calls'] += 1
+            record['seconds'] += elapsed
+            record['peak_rss'] = max(record['peak_rss'], peak)
+        return False
+
+
+def stage(name):
+    """Context manager timing a stage, a shared no-op while instrumentation is off."""
+    return _Stage(name) if _enabled else _NULL
+
+
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + int(n)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(profile_stage=None, sample_interval=0.01):
+    global _enabled, _sampler, _profile_stage, _profiler, _last_rss
+    _enabled = True
+    _last_rss = rss()
+    _profile_stage = profile_stage
+    _profiler = cProfile.Profile() if profile_stage else None
+    if _sampler is None and sample_interval:
+        _sampler = _Sampler(sample_interval)
+        _sampler.start()
+
+
+def disable():
+    global _enabled, _sampler
+    _enabled = False
+    if _sampler is not None:
+        _sampler.stopped.set()
+        _sampler = None
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def snapshot():
+    with _lock:
+        return {'stages': {name: dict(record) for name, record in _stages.items()}, 'counters': dict(_counters)}
+
+
+def merge(other):
+    """Adds a snapshot from another process, such as a pipeline worker."""
+    with _lock:
+        for name, theirs in other['stages'].items():
+            record = _stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_rss': 0})
+            record['calls'] += theirs['calls']
+            record['seconds'] += theirs['seconds']
+            record['peak_rss'] = max(record['peak_rss'], theirs['peak_rss'])
+        for name, value in other['counters'].items():
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=2, ensure_ascii=False)
+
+
+def to_prometheus():
+    data = snapshot()
+    lines = ['# TYPE backtest_stage_seconds_total counter']
+    lines += [f'backtest_stage_seconds_total{{stage="{name}"}} {r["seconds"]}' for name, r in data['stages'].items()]
+    lines += ['# TYPE backtest_stage_calls_total counter']
+    lines += [f'backtest_stage_calls_total{{stage="{name}"}} {r["calls"]}' for name, r in data['stages'].items()]
+    lines += ['# TYPE backtest_stage_peak_rss_bytes gauge']
+    lines += [f'backtest_stage_peak_rss_bytes{{stage="{name}"}} {r["peak_rss"]}' for name, r in data['stages'].items()]
+    lines += ['# TYPE backtest_events_total counter']
+    lines += [f'backtest_events_total{{name="{name}"}} {value}' for name, value in data['counters'].items()]
+    return '\n'.join(lines) + '\n'
+
+
+def write(path):
+    text = to_prometheus() if path.endswith(('.prom', '.txt')) else to_json()
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def profile_report(path=None, limit=40):
+    """cProfile statistics of the profiled stage, sorted by cumulative time."""
+    out = io.StringIO()
+    try:
+        pstats.Stats(_profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+    except (TypeError, ValueError):
+        # No profiler, or the stage never ran
+        return ''
+    if path:
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(out.getvalue())
+    return out.getvalue()
+
+
+def _after_fork():
+    # A forked worker reports only its own work, and the sampler thread did not survive the fork
+    global _lock, _sampler
+    _lock = threading.Lock()
+    _stages.clear()
+    _counters.clear()
+    _active.clear()
+    if _sampler is not None:
+        _sampler = _Sampler(_sampler.interval)
+        _sampler.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def save_profile():
+    # Worker processes write their own report next to the main one, suffixed with their pid
+    if _profile_stage and _profile_path:
+        profile_report(_profile_path if os.getpid() == _main_pid else f'{_profile_path}.{os.getpid()}')
+
+
+_main_pid = os.getpid()
+_profile_path = None
+if os.environ.get('INSTRUMENT'):
+    enable(os.environ.get('PROFILE_STAGE'))
+    _profile_path = os.environ.get('PROFILE_OUTPUT', f'profile_{_profile_stage}.txt')
+    atexit.register(write, os.environ['INSTRUMENT'])
+    atexit.register(save_profile)
@@ -0,0 +1,127 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from klines import KLINE_DTYPE, decode_klines, to_frame
+from instrument import timed
+
+DAY_MS = 86_400_000
+
+
+def to_ms(value) -> int:
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(pd.Timestamp(value).value // 1_000_000)
+        except ValueError:
+            # Relative dates such as "2 years ago UTC"
+            from binance.helpers import date_to_milliseconds
+            return date_to_milliseconds(value)
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+class KlineStore:
+    """Closed klines on disk as one .npy file per symbol, interval and UTC day."""
+
+    def __init__(self, root='klines', client=None):
+        self.root = root
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from binance.client import Client
+            self._client = Client()
+        return self._client
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, symbol, interval)
+
+    def _days(self, symbol, interval):
+        path = self._dir(symbol, interval)
+        if not os.path.isdir(path):
+            return []
+        # A .tmp file left behind by an interrupted write is not a day
+        return sorted(name[:-4] for name in os.listdir(path) if name.endswith('.npy') and '.tmp' not in name)
+
+    def _read_day(self, symbol, interval, day):
+        return np.load(os.path.join(self._dir(symbol, interval), f'{day}.npy'), mmap_mode='r')
+
+    def _write(self, symbol, interval, array):
+        path = self._dir(symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        days = array['open_time'] // DAY_MS
+        for day in np.unique(days):
+            name = str(np.datetime64(int(day), 'D'))
+            part = array[days == day]
+            target = os.path.join(path, f'{name}.npy')
+            if os.path.exists(target):
+                part = np.concatenate([np.load(target), part])
+            _, keep = np.unique(part['open_time'], return_index=True)
+            tmp = target + '.tmp'
+            # Through a file object, np.save() would add .npy to the name
+            with open(tmp, 'wb') as file:
+                np.save(file, part[keep])
+            os.replace(tmp, target)
+
+    def first_open_time(self, symbol, interval):
+        days = self._days(symbol, interval)
+        return int(self._read_day(symbol, interval, days[0])['open_time'][0]) if days else None
+
+    def last_close_time(self, symbol, interval):
+        days = self._days(symbol, interval)
+        return int(self._read_day(symbol, interval, days[-1])['close_time'][-1]) if days else None
+
+    @timed('fetch')
+    def _fetch(self, symbol, interval, start_ms, end_ms):
+        k_lines = self.client.get_historical_klines(
+            symbol=symbol,
+            interval=interval,
+            start_str=start_ms,
+            end_str=end_ms
+        )
+        array = decode_klines(k_lines)
+        # The current candle is still open, keep only closed ones on disk
+        return array[array['close_time'] < int(time.time() * 1000)]
+
+    def sync(self, symbol, interval, start_str, end_str=None):
+        start_ms = to_ms(start_str)
+        end_ms = to_ms(end_str) if end_str is not None else int(time.time() * 1000)
+        first = self.first_open_time(symbol, interval)
+        last = self.last_close_time(symbol, interval)
+
+        if first is None:
+            self._write(symbol, interval, self._fetch(symbol, interval, start_ms, end_ms))
+            return
+        if start_ms < first:
+            self._write(symbol, interval, self._fetch(symbol, interval, start_ms, first - 1))
+        if last < end_ms:
+            self._write(symbol, interval, self._fetch(symbol, interval, last + 1, end_ms))
+
+    def iter_days(self, symbol, interval, start_str=None, end_str=None):
+        """Memory-mapped klines one stored day at a time, trimmed to the range."""
+        start_ms = to_ms(start_str) if start_str is not None else None
+        end_ms = to_ms(end_str) if end_str is not None else None
+        for day in self._days(symbol, interval):
+            day_ms = int(np.datetime64(day, 'ms').astype(np.int64))
+            if start_ms is not None and day_ms + DAY_MS <= start_ms:
+                continue
+            if end_ms is not None and day_ms > end_ms:
+                break
+            array = self._read_day(symbol, interval, day)
+            lo = 0 if start_ms is None else np.searchsorted(array['open_time'], start_ms, side='left')
+            hi = len(array) if end_ms is None else np.searchsorted(array['open_time'], end_ms, side='right')
+            yield array[lo:hi]
+
+    def read(self, symbol, interval, start_str=None, end_str=None) -> np.ndarray:
+        parts = list(self.iter_days(symbol, interval, start_str, end_str))
+        if not parts:
+            return np.empty(0, dtype=KLINE_DTYPE)
+        return np.concatenate(parts)
+
+    def load(self, symbol, interval, start_str, end_str=None) -> pd.DataFrame:
+        start_ms = to_ms(start_str)
+        end_ms = to_ms(end_str) if end_str is not None else int(time.time() * 1000)
+        self.sync(symbol, interval, start_ms, end_ms)
+        return to_frame(self.read(symbol, interval, start_ms, end_ms))
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from instrument import timed, count
+
+# Binance kline payload without the trailing 'ignore' field
+KLINE_DTYPE = np.dtype([
+    ('open_time', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+    ('close_time', np.int64),
+    ('quote_asset_volume', np.float64),
+    ('number_of_trades', np.int64),
+    ('taker_buy_base_asset_volume', np.float64),
+    ('taker_buy_quote_asset_volume', np.float64),
+])
+
+KLINE_COLUMNS = ['time'] + list(KLINE_DTYPE.names[1:])
+
+
+@timed('parse')
+def decode_klines(k_lines) -> np.ndarray:
+    count('candles', len(k_lines))
+    # numpy parses the string fields while filling each record, no object columns in between
+    return np.fromiter((tuple(k[:11]) for k in k_lines), dtype=KLINE_DTYPE, count=len(k_lines))
+
+
+@timed('frame')
+def to_frame(array: np.ndarray) -> pd.DataFrame:
+    k_lines = pd.DataFrame({name: array[name] for name in KLINE_DTYPE.names}, copy=False)
+    k_lines.columns = KLINE_COLUMNS
+    k_lines['time'] = array['open_time'].astype('datetime64[ms]').astype('datetime64[ns]')
+    return k_lines
+
+
+def klines_frame(k_lines) -> pd.DataFrame:
+    return to_frame(decode_klines(k_lines))
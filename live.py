@@ -0,0 +1,225 @@
+import asyncio
+import bisect
+import inspect
+import json
+import time
+import numpy as np
+from dataclasses import dataclass
+from positions import PositionBook
+from streaming import SMA, EMA, RSI, CCI, ADX, VWMA
+from signals import cci_adx_signals
+
+STREAM_URL = 'wss://stream.binance.com:9443/ws'
+CANDLE_INPUTS = ('high', 'low', 'close', 'volume')
+
+
+@dataclass
+class Candle:
+    open_time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    close_time: int
+    closed: bool
+    received: float = None
+
+
+def kline_message(candle: Candle, symbol='BTCUSDT', interval='1m'):
+    # Binance websocket kline event for a candle, used by the replay server
+    return json.dumps({'e': 'kline', 'E': candle.close_time, 's': symbol, 'k': {
+        't': candle.open_time, 'T': candle.close_time, 's': symbol, 'i': interval,
+        'o': str(candle.open), 'h': str(candle.high), 'l': str(candle.low), 'c': str(candle.close),
+        'v': str(candle.volume), 'x': candle.closed,
+    }})
+
+
+def parse_message(message, received=None) -> Candle:
+    k = json.loads(message)['k']
+    return Candle(int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']),
+                  int(k['T']), bool(k['x']), received)
+
+
+def parse_row(row, received=None) -> Candle:
+    # A row as returned by get_historical_klines, always a closed candle
+    return Candle(int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]),
+                  int(row[6]), True, received)
+
+
+async def websocket_source(symbol, interval, url=STREAM_URL, reconnect_delay=1.0):
+    """Candles from the Binance kline stream, reconnecting when the connection drops."""
+    import websockets
+    stream = f'{url}/{symbol.lower()}@kline_{interval}'
+    while True:
+        try:
+            async with websockets.connect(stream) as connection:
+                async for message in connection:
+                    yield parse_message(message, time.perf_counter())
+        except (OSError, websockets.ConnectionClosedError):
+            await asyncio.sleep(reconnect_delay)
+
+
+async def replay_source(rows, delay=0.0):
+    for row in rows:
+        yield parse_row(row, time.perf_counter())
+        await asyncio.sleep(delay)
+
+
+async def file_source(path, delay=0.0):
+    # One websocket message or one get_historical_klines row per line
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            received = time.perf_counter()
+            yield parse_message(line, received) if line.lstrip().startswith('{') else parse_row(json.loads(line), received)
+            await asyncio.sleep(delay)
+
+
+async def serve_replay(rows, symbol='BTCUSDT', interval='1m', host='127.0.0.1', port=0, delay=0.0):
+    """Local websocket server that replays klines in the Binance stream format.
+
+    Returns the server, connect with websocket_source(symbol, interval, url=f'ws://{host}:{port}/ws').
+    """
+    import websockets
+
+    async def replay(connection):
+        for row in rows:
+            await connection.send(kline_message(parse_row(row), symbol, interval))
+            await asyncio.sleep(delay)
+        await connection.close()
+
+    return await websockets.serve(replay, host, port)
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets from 1 us to 10 s, so memory does not grow with the run."""
+
+    def __init__(self, low=1e-6, high=10.0, buckets_per_decade=20):
+        decades = int(round(np.log10(high / low)))
+        self.edges = np.logspace(np.log10(low), np.log10(high), decades * buckets_per_decade + 1).tolist()
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.edges, seconds)] += 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        # Upper edge of the bucket holding the q-th percentile
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.edges[i] if i < len(self.edges) else self.max
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'p50': self.percentile(50), 'p99': self.percentile(99), 'max': self.max}
+
+
+def cci_adx_indicators(adx_window=14, cci_window=20):
+    # ADX and CCI as LR6.py adds them
+    return {'adx': ADX(adx_window), 'cci': CCI(cci_window)}
+
+
+def trend_indicators():
+    # Same windows as TREND_INDICATORS in pipeline.py, for the Залікова.py rule
+    return {'ema': EMA(12), 'sma': SMA(40), 'vwma': VWMA(12), 'rsi': RSI(40), 'adx': ADX(40)}
+
+
+def _inputs(indicator):
+    # Candle fields an indicator's update() takes, single value indicators get the close
+    names = list(inspect.signature(indicator.update).parameters)
+    return [name if name in CANDLE_INPUTS else 'close' for name in names]
+
+
+class LiveStrategy:
+    """Streaming indicators with the create_signals rule applied to the latest closed candle.
+
+    Backtest replay (engine.py) and live trading feed candles through the same on_candle.
+    """
+
+    def __init__(self, create_signals=cci_adx_signals, indicators=None, symbol=None, on_signal=None, on_exit=None):
+        self.create_signals = create_signals
+        self.indicators = indicators if indicators is not None else cci_adx_indicators()
+        self._inputs = {name: _inputs(indicator) for name, indicator in self.indicators.items()}
+        self.symbol = symbol
+        self.on_signal = on_signal
+        self.on_exit = on_exit
+        self.positions = PositionBook()
+        self.closed = []
+        self.latency = LatencyHistogram()
+
+    def _update(self, candle):
+        values = {}
+        for name, indicator in self.indicators.items():
+            value = indicator.update(*(getattr(candle, field) for field in self._inputs[name]))
+            values[name] = [np.nan if value is None else value]
+        return values
+
+    def warm_up(self, k_lines):
+        for high, low, close, volume in zip(*(k_lines[name] for name in CANDLE_INPUTS)):
+            close = float(close)
+            self._update(Candle(0, close, float(high), float(low), close, float(volume), 0, True))
+
+    def _check_exits(self, high, low):
+        for signal in self.positions.on_candle(high, low):
+            self.closed.append(signal)
+            if self.on_exit:
+                self.on_exit(signal)
+
+    def on_candle(self, candle: Candle):
+        # Open candles carry the running high/low, so exits are seen before the candle closes
+        self._check_exits(candle.high, candle.low)
+        if not candle.closed:
+            return None
+
+        latest = self._update(candle)
+        latest['time'] = np.array([candle.open_time], dtype='datetime64[ms]').astype('datetime64[ns]')
+        latest['close'] = [candle.close]
+        if self.symbol is not None:
+            latest['symbol'] = [self.symbol]
+        signals = self.create_signals(latest)
+        signal = signals[0] if len(signals) else None
+        if signal is not None:
+            if self.on_signal:
+                self.on_signal(signal)
+            self.positions.open(signal)
+            # The backtest also checks the signal's own candle
+            self._check_exits(candle.high, candle.low)
+        if candle.received is not None:
+            self.latency.record(time.perf_counter() - candle.received)
+        return signal
+
+
+async def run_live(source, strategy: LiveStrategy, max_pending=1024):
+    """Feeds candles from an async source to the strategy until the source ends."""
+    queue = asyncio.Queue(max_pending)
+
+    async def receive():
+        try:
+            async for candle in source:
+                await queue.put(candle)
+        finally:
+            await queue.put(None)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while (candle := await queue.get()) is not None:
+            # When behind, an open candle is superseded by the next update for it
+            if not candle.closed and not queue.empty():
+                continue
+            strategy.on_candle(candle)
+    except BaseException:
+        receiver.cancel()
+        raise
+    # Raises the error that ended the source, if any
+    await receiver
+    return strategy
@@ -0,0 +1,187 @@
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from exits import ExitResolver, EXIT_OPEN
+from signals import cci_adx_signals
+from run_cache import fingerprint
+
+# Parameter ranges sampled with uniform() in LR_6.py
+SPACE = {
+    'cci_long': (-300, 300),
+    'cci_short': (-300, 300),
+    'adx_cond': (0, 100),
+    'take_prof_long': (0.005, 0.025),
+    'take_prof_short': (0.005, 0.025),
+    'stop_loss_long': (0.005, 0.025),
+    'stop_loss_short': (0.005, 0.025),
+}
+
+COLUMNS = ['close', 'high', 'low', 'cci', 'adx']
+RESULT_COLUMNS = ['trades', 'pnl', 'profit_factor']
+
+
+def _scale(space, unit):
+    low = np.array([bounds[0] for bounds in space.values()], dtype=np.float64)
+    high = np.array([bounds[1] for bounds in space.values()], dtype=np.float64)
+    return pd.DataFrame(low + unit * (high - low), columns=list(space))
+
+
+def random_samples(space, n, rng):
+    return _scale(space, rng.random((n, len(space))))
+
+
+def latin_hypercube_samples(space, n, rng):
+    # One sample in each of n equal strata per parameter, strata shuffled independently
+    unit = (np.arange(n)[:, None] + rng.random((n, len(space)))) / n
+    for column in range(len(space)):
+        unit[:, column] = rng.permutation(unit[:, column])
+    return _scale(space, unit)
+
+
+def grid_samples(space, n, rng=None):
+    points = max(2, int(round(n ** (1 / len(space)))))
+    axis = np.linspace(0, 1, points)
+    return _scale(space, np.array(list(itertools.product(axis, repeat=len(space)))))
+
+
+SAMPLERS = {
+    'random': random_samples,
+    'grid': grid_samples,
+    'lhs': latin_hypercube_samples,
+}
+
+
+def profit_factor(results):
+    # Same rule as profit_factor in LR_6.py
+    total_profit = results[results > 0].sum()
+    total_loss = results[results <= 0].sum()
+    if total_loss == 0 or total_profit == 0:
+        return 1
+    return total_profit / abs(total_loss)
+
+
+def run_trial(data, resolver, params):
+    signals = cci_adx_signals(data, **params)
+    exits = resolver.resolve(signals.index, signals.side, signals.entry, signals.take_profit, signals.stop_loss)
+    results = exits.result[exits.exit_reason != EXIT_OPEN]
+    return len(results), float(results.sum()), float(profit_factor(results))
+
+
+# Per-process state, set once by _init_worker
+_data = None
+_resolver = None
+_shm = None
+
+
+def _set_data(array):
+    global _data, _resolver
+    _data = dict(zip(COLUMNS, array))
+    _resolver = ExitResolver(_data['high'], _data['low'])
+
+
+def _init_worker(name, n):
+    global _shm
+    _shm = shared_memory.SharedMemory(name=name)
+    _set_data(np.ndarray((len(COLUMNS), n), dtype=np.float64, buffer=_shm.buf))
+
+
+def _run_batch(batch):
+    return [(trial, *run_trial(_data, _resolver, params)) for trial, params in batch]
+
+
+def _check_klines(results_path, data_fingerprint):
+    # Trials computed on other klines are out of date, the run starts over on these ones
+    marker = f'{results_path}.klines'
+    try:
+        with open(marker) as file:
+            stored = file.read().strip()
+    except FileNotFoundError:
+        stored = None
+    if stored == data_fingerprint:
+        return
+    if os.path.exists(results_path):
+        os.remove(results_path)
+    with open(marker, 'w') as file:
+        file.write(data_fingerprint)
+
+
+def _load_done(results_path, samples, space):
+    if not (results_path and os.path.exists(results_path)):
+        return None
+    done = pd.read_csv(results_path, float_precision='round_trip')
+    # Rows of another sampler, seed or space must not pass for trials of this run
+    expected = samples.set_index('trial').reindex(done['trial'])[list(space)].to_numpy()
+    if set(done.columns) != {'trial', *RESULT_COLUMNS, *space} \
+            or not np.array_equal(expected, done[list(space)].to_numpy(dtype=np.float64)):
+        raise ValueError(f"{results_path} holds trials of another sampler, seed, space or number of trials")
+    return done
+
+
+def _collect(outputs, samples, results_path, write_header):
+    rows = []
+    for output in outputs:
+        part = pd.DataFrame(output, columns=['trial'] + RESULT_COLUMNS).merge(samples, on='trial')
+        rows.append(part)
+        if results_path:
+            part.to_csv(results_path, mode='a', header=write_header, index=False)
+            write_header = False
+    return rows
+
+
+def optimize(k_lines: pd.DataFrame, sampler='random', n_trials=1000, seed=0, space=SPACE,
+             results_path=None, workers=None, batch_size=64):
+    samples = SAMPLERS[sampler](space, n_trials, np.random.default_rng(seed))
+    samples.insert(0, 'trial', np.arange(len(samples)))
+
+    # Trials are deterministic for a given seed and klines, so a resumed run skips the ones already stored
+    if results_path:
+        _check_klines(results_path, fingerprint(k_lines[COLUMNS]))
+    done = _load_done(results_path, samples, space)
+    todo = samples if done is None else samples[~samples['trial'].isin(done['trial'])]
+    trials = [(int(row.trial), {name: getattr(row, name) for name in space}) for row in todo.itertuples()]
+    batches = [trials[i:i + batch_size] for i in range(0, len(trials), batch_size)]
+
+    n = len(k_lines)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(COLUMNS) * n * 8))
+    try:
+        array = np.ndarray((len(COLUMNS), n), dtype=np.float64, buffer=shm.buf)
+        for i, column in enumerate(COLUMNS):
+            array[i] = k_lines[column].to_numpy(dtype=np.float64)
+
+        if workers == 1:
+            _set_data(array)
+            rows = _collect(map(_run_batch, batches), samples, results_path, done is None)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shm.name, n)) as executor:
+                rows = _collect(executor.map(_run_batch, batches), samples, results_path, done is None)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    table = pd.concat(rows, ignore_index=True) if rows else None
+    if done is not None:
+        table = done if table is None else pd.concat([done, table], ignore_index=True)
+    if table is None:
+        table = pd.DataFrame(columns=['trial'] + RESULT_COLUMNS + list(space))
+    return table.sort_values(['pnl', 'profit_factor'], ascending=False, ignore_index=True)
+
+
+def main():
+    from binance import Client
+    from kline_store import KlineStore
+    from indicator_cache import IndicatorCache
+
+    store = KlineStore(client=Client())
+    k_lines = store.load("BTCUSDT", Client.KLINE_INTERVAL_1MINUTE, "1 week ago UTC", "now UTC")
+    k_lines = IndicatorCache().add("BTCUSDT", Client.KLINE_INTERVAL_1MINUTE, k_lines, [('adx', 14), ('cci', 20)])
+
+    table = optimize(k_lines, sampler='lhs', n_trials=5000, seed=42, results_path='optimizer_results.csv')
+    print(table.head(20).to_string())
+
+
+if __name__ == "__main__":
+    main()
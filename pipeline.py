@@ -0,0 +1,98 @@
+import time
+import multiprocessing
+import pandas as pd
+import instrument
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from kline_store import KlineStore, to_ms
+from fetcher import WeightLimiter, limited
+from klines import to_frame
+from indicator_cache import IndicatorCache
+from exits import resolve_signals
+from signals import trend_signals
+from tradebook import TradeBook
+from chunked import chunked_backtest, kline_blocks
+from run_cache import RunCache, fingerprint
+
+# Indicators used by the Залікова.py strategy
+TREND_INDICATORS = [('ema', 12), ('sma', 40), ('vwma', 12), ('rsi', 40), ('adx', 40)]
+
+
+def download(store, limiter, symbol, interval, start_ms, end_ms):
+    # Every page request waits for its weight in the limiter the download threads share
+    with instrument.stage('download'):
+        KlineStore(store.root, limited(store.client, limiter)).sync(symbol, interval, start_ms, end_ms)
+    return symbol
+
+
+def trend_strategy(k_lines):
+    signals = trend_signals(k_lines)
+    return TradeBook.from_exits(signals, resolve_signals(k_lines, signals))
+
+
+def backtest_symbol(root, symbol, interval, start_ms, end_ms, indicators=TREND_INDICATORS, strategy=trend_strategy,
+                    block=None, create_signals=trend_signals, cache=False):
+    # Runs in a worker process and reads the klines memory-mapped from the store
+    if cache:
+        # The trades of an earlier run with the same strategy, indicators and candles
+        runs = RunCache(root)
+        config = {'symbol': symbol, 'interval': interval, 'indicators': indicators, 'block': block,
+                  'strategy': create_signals if block else strategy}
+        key = runs.key(config, fingerprint(KlineStore(root).iter_days(symbol, interval, start_ms, end_ms)))
+        book = runs.get(key)
+        if book is None:
+            book = backtest_symbol(root, symbol, interval, start_ms, end_ms, indicators, strategy, block, create_signals)
+            runs.put(key, book)
+        return book
+    if block:
+        # Chunked mode, the stored days are read in blocks and create_signals replaces strategy
+        days = KlineStore(root).iter_days(symbol, interval, start_ms, end_ms)
+        return chunked_backtest(kline_blocks(days, block), create_signals, indicators, symbol)
+    k_lines = to_frame(KlineStore(root).read(symbol, interval, start_ms, end_ms))
+    k_lines['symbol'] = symbol
+    IndicatorCache(root).add(symbol, interval, k_lines, indicators)
+    return strategy(k_lines)
+
+
+def _backtest_worker(*args):
+    # Stage metrics of a worker process travel back with its result
+    book = backtest_symbol(*args)
+    if not instrument.enabled():
+        return book, None
+    metrics = instrument.snapshot()
+    instrument.reset()
+    instrument.save_profile()
+    return book, metrics
+
+
+def run_pipeline(symbols, interval, start_str, end_str=None, client=None, root='klines',
+                 max_downloads=4, workers=None, limiter=None,
+                 indicators=TREND_INDICATORS, strategy=trend_strategy, block=None, create_signals=trend_signals,
+                 cache=False):
+    start_ms = to_ms(start_str)
+    end_ms = to_ms(end_str) if end_str is not None else int(time.time() * 1000)
+    store = KlineStore(root, client)
+    limiter = limiter or WeightLimiter()
+
+    # Each symbol goes to the process pool as soon as its download is done. The workers are
+    # spawned, a fork while the download threads run could copy a lock one of them holds.
+    with ThreadPoolExecutor(max_downloads) as downloads, \
+            ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pending = [downloads.submit(download, store, limiter, symbol, interval, start_ms, end_ms)
+                   for symbol in symbols]
+        backtests = {}
+        for future in as_completed(pending):
+            symbol = future.result()
+            backtests[symbol] = pool.submit(_backtest_worker, root, symbol, interval, start_ms, end_ms,
+                                            indicators, strategy, block, create_signals, cache)
+        books = {}
+        for symbol in symbols:
+            books[symbol], metrics = backtests[symbol].result()
+            if metrics:
+                instrument.merge(metrics)
+        return books
+
+
+def report(books):
+    rows = {symbol: book.statistics() for symbol, book in books.items()}
+    rows['TOTAL'] = TradeBook.concat(list(books.values())).statistics()
+    return pd.DataFrame.from_dict(rows, orient='index')
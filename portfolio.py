@@ -0,0 +1,89 @@
+import heapq
+import numpy as np
+from dataclasses import dataclass
+from exits import EXIT_OPEN, EXIT_TP, resolve_signals
+from tradebook import TradeBook
+
+
+@dataclass
+class Portfolio:
+    book: TradeBook
+    equity: np.ndarray
+    signals: int
+    skipped: int
+    still_open: int
+
+    def max_drawdown(self):
+        # Fraction of the running peak lost, all of it while the peak is not above zero
+        if not len(self.equity):
+            return 0.0
+        peak = np.maximum.accumulate(self.equity)
+        positive = peak > 0
+        drawdown = np.where(positive, (peak - self.equity) / np.where(positive, peak, 1.0), 1.0)
+        return float(np.max(drawdown))
+
+    def statistics(self):
+        statistics = self.book.statistics()
+        statistics.update({
+            'signals': self.signals,
+            'skipped': self.skipped,
+            'still_open': self.still_open,
+            'final_equity': float(self.equity[-1]) if len(self.equity) else None,
+            'max_drawdown': self.max_drawdown(),
+        })
+        return statistics
+
+
+def simulate(k_lines, signals, exits=None, max_positions=1, cooldown=0, capital=10_000.0, position_size=0.1,
+             fee=0.001, slippage=0.0005) -> Portfolio:
+    """Trades only the signals a single account could take, in time order.
+
+    A signal is skipped while max_positions are open, within `cooldown` candles of the
+    previous entry, or once equity is gone. Positions are sized as position_size of the
+    realised equity at entry. Fills are moved against the trade by `slippage` and pay
+    `fee` on both sides, so book.result is the net P&L of the position.
+    """
+    exits = exits if exits is not None else resolve_signals(k_lines, signals)
+    start = np.asarray(signals.index, dtype=np.int64)
+    sign = np.asarray(signals.side, dtype=np.float64)
+    closed = exits.exit_reason != EXIT_OPEN
+    exit_price = np.where(exits.exit_reason == EXIT_TP, signals.take_profit, signals.stop_loss)
+    entry_fill = signals.entry * (1 + sign * slippage)
+    exit_fill = exit_price * (1 - sign * slippage)
+    unit_pnl = sign * (exit_fill - entry_fill) - fee * (entry_fill + exit_fill)
+
+    # Positions that never close hold their slot past the last candle
+    n = len(k_lines)
+    exit_at = np.where(closed, exits.exit_index, n)
+
+    equity = capital
+    last_entry = None
+    open_positions = []
+    taken, quantity, pnl = [], [], []
+    for i, (s, e) in enumerate(zip(start.tolist(), exit_at.tolist())):
+        # Exits up to this candle happen before its close, where the signal enters
+        while open_positions and open_positions[0][0] <= s:
+            equity += heapq.heappop(open_positions)[1]
+        if len(open_positions) >= max_positions or equity <= 0:
+            continue
+        if last_entry is not None and s - last_entry <= cooldown:
+            continue
+        size = equity * position_size / entry_fill[i]
+        result = unit_pnl[i] * size if closed[i] else 0.0
+        heapq.heappush(open_positions, (e, result))
+        last_entry = s
+        taken.append(i)
+        quantity.append(size)
+        pnl.append(result)
+
+    taken = np.asarray(taken, dtype=np.int64)
+    quantity, pnl = np.asarray(quantity, dtype=np.float64), np.asarray(pnl, dtype=np.float64)
+    done = closed[taken]
+    realised = np.bincount(exit_at[taken][done], weights=pnl[done], minlength=n)[:n]
+    return Portfolio(
+        book=TradeBook.from_exits(signals, exits, taken[done], quantity[done], pnl[done]),
+        equity=capital + np.cumsum(realised),
+        signals=len(start),
+        skipped=len(start) - len(taken),
+        still_open=int(np.count_nonzero(~done)),
+    )
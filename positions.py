@@ -0,0 +1,78 @@
+import heapq
+from exits import SIDES, SIDE_BUY, EXIT_TP, EXIT_SL, EXIT_LABELS
+
+# Closed positions leave an entry behind in their other heap, they are dropped lazily
+# and the heaps are rebuilt once there are more of them than this plus the open positions
+COMPACT_SLACK = 1024
+
+
+class PositionBook:
+    """Open positions in TP/SL price-level heaps per side.
+
+    A candle only pops the levels its high or low reaches, so each exit costs O(log n)
+    in the number of open positions and nothing is rescanned for positions it misses.
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self._next_id = 0
+        self._stale = 0
+        # (key, id) min-heaps, levels that are reached from above are negated
+        self._buy_tp = []   # high >= take_profit
+        self._buy_sl = []   # low <= stop_loss
+        self._sell_tp = []  # low <= take_profit
+        self._sell_sl = []  # high >= stop_loss
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions.values())
+
+    def open(self, signal):
+        i = self._next_id
+        self._next_id += 1
+        self.positions[i] = signal
+        if SIDES[signal.side] == SIDE_BUY:
+            heapq.heappush(self._buy_tp, (signal.take_profit, i))
+            heapq.heappush(self._buy_sl, (-signal.stop_loss, i))
+        else:
+            heapq.heappush(self._sell_tp, (-signal.take_profit, i))
+            heapq.heappush(self._sell_sl, (signal.stop_loss, i))
+
+    def _reached(self, heap, bound):
+        ids = []
+        while heap and heap[0][0] <= bound:
+            i = heapq.heappop(heap)[1]
+            if i in self.positions:
+                ids.append(i)
+            else:
+                self._stale -= 1
+        return ids
+
+    def _close(self, i, reason):
+        signal = self.positions.pop(i)
+        self._stale += 1
+        buy = SIDES[signal.side] == SIDE_BUY
+        price = signal.take_profit if reason == EXIT_TP else signal.stop_loss
+        signal.result = price - signal.entry if buy else signal.entry - price
+        signal.closed_by = EXIT_LABELS[reason]
+        return signal
+
+    def _compact(self):
+        for name in ('_buy_tp', '_buy_sl', '_sell_tp', '_sell_sl'):
+            heap = [entry for entry in getattr(self, name) if entry[1] in self.positions]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self._stale = 0
+
+    def on_candle(self, high, low):
+        """Closes the positions whose TP or SL lies within the candle and returns them, TP first."""
+        closed = [self._close(i, EXIT_TP)
+                  for i in self._reached(self._buy_tp, high) + self._reached(self._sell_tp, -low)]
+        # A position closed by TP above is already gone from self.positions here
+        closed += [self._close(i, EXIT_SL)
+                   for i in self._reached(self._buy_sl, -low) + self._reached(self._sell_sl, high)]
+        if self._stale > len(self.positions) + COMPACT_SLACK:
+            self._compact()
+        return closed
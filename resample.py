@@ -0,0 +1,77 @@
+import numpy as np
+from fetcher import INTERVAL_MS
+from kline_store import DAY_MS
+from klines import KLINE_DTYPE, to_frame
+
+# Intervals that split a UTC day evenly, so buckets are aligned to the epoch like Binance's
+RESAMPLE_INTERVALS = [interval for interval, ms in INTERVAL_MS.items() if DAY_MS % ms == 0]
+
+SUMMED = ['volume', 'quote_asset_volume', 'number_of_trades',
+          'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume']
+
+
+def resample(array, interval) -> np.ndarray:
+    """Aggregates sorted KLINE_DTYPE candles into `interval` candles, one group reduction per field."""
+    step = INTERVAL_MS[interval]
+    if not len(array):
+        return np.empty(0, dtype=KLINE_DTYPE)
+    bucket = array['open_time'] // step
+    starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    ends = np.append(starts[1:], len(array)) - 1
+
+    out = np.empty(len(starts), dtype=KLINE_DTYPE)
+    out['open_time'] = bucket[starts] * step
+    out['close_time'] = out['open_time'] + step - 1
+    out['open'] = array['open'][starts]
+    out['high'] = np.maximum.reduceat(array['high'], starts)
+    out['low'] = np.minimum.reduceat(array['low'], starts)
+    out['close'] = array['close'][ends]
+    for name in SUMMED:
+        out[name] = np.add.reduceat(array[name], starts)
+    return out
+
+
+class Resampler:
+    """Higher interval candles derived from the stored 1m klines and kept in the same store."""
+
+    def __init__(self, store, base='1m'):
+        self.store = store
+        self.base = base
+
+    def update(self, symbol, interval):
+        """Derives the candles the store does not have yet, returns how many were added."""
+        if interval not in RESAMPLE_INTERVALS:
+            raise ValueError(f"Can't derive {interval} candles, use one of {RESAMPLE_INTERVALS}")
+        store, step = self.store, INTERVAL_MS[interval]
+        base_first = store.first_open_time(symbol, self.base)
+        base_last = store.last_close_time(symbol, self.base)
+        if base_first is None:
+            return 0
+        first = store.first_open_time(symbol, interval)
+        last = store.last_close_time(symbol, interval)
+
+        if first is None:
+            ranges = [(base_first, base_last)]
+        else:
+            # Minutes backfilled before the first derived candle and new ones after the last
+            ranges = [(lo, hi) for lo, hi in [(base_first, first - 1), (last + 1, base_last)] if lo <= hi]
+        added = 0
+        for lo, hi in ranges:
+            part = resample(store.read(symbol, self.base, lo // step * step, hi), interval)
+            # Only whole buckets, a partial one is derived again once its minutes are stored
+            part = part[(part['open_time'] >= base_first) & (part['close_time'] <= base_last)]
+            if len(part):
+                store._write(symbol, interval, part)
+                added += len(part)
+        return added
+
+    def read(self, symbol, interval, start_str=None, end_str=None) -> np.ndarray:
+        if interval != self.base:
+            self.update(symbol, interval)
+        return self.store.read(symbol, interval, start_str, end_str)
+
+    def load(self, symbol, interval, start_str, end_str=None, sync=True):
+        # With sync=False only what is already stored is used, no network access at all
+        if sync:
+            self.store.sync(symbol, self.base, start_str, end_str)
+        return to_frame(self.read(symbol, interval, start_str, end_str))
@@ -0,0 +1,216 @@
+import os
+import sys
+import hashlib
+import json
+import functools
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from tradebook import TradeBook
+from instrument import count
+
+BOOK_COLUMNS = ('time', 'asset', 'quantity', 'side', 'entry', 'take_profit', 'stop_loss', 'result', 'exit_reason')
+
+# Modules next to this one are the project, changes to their code change the cache keys
+_PROJECT = os.path.dirname(os.path.abspath(__file__))
+_digests = {}
+
+
+def _is_project(obj):
+    module = sys.modules.get(getattr(obj, '__module__', None))
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == _PROJECT
+
+
+def _code_digest(code, update):
+    update(code.co_code)
+    update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _code_digest(const, update)
+        else:
+            update(repr(const).encode())
+
+
+def _names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            names |= _names(const)
+    return names
+
+
+def _digest(obj, seen=None):
+    """Hash of a function or class with the project code it calls, so editing a threshold
+    in create_signals or cci_adx_signals gives new keys."""
+    if obj in _digests:
+        return _digests[obj]
+    seen = set() if seen is None else seen
+    seen.add(obj)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{obj.__module__}.{obj.__qualname__}'.encode())
+    members = [getattr(value, '__func__', value) for value in vars(obj).values()] if isinstance(obj, type) else [obj]
+    functions = [member for member in members if hasattr(member, '__code__')]
+    for function in functions:
+        _code_digest(function.__code__, h.update)
+        h.update(repr(_describe(function.__defaults__)).encode())
+        h.update(repr(_describe(function.__kwdefaults__)).encode())
+        for name in sorted(_names(function.__code__)):
+            value = function.__globals__.get(name)
+            value = getattr(value, 'py_func', value)
+            if (isinstance(value, type) or hasattr(value, '__code__')) and _is_project(value) and value not in seen:
+                h.update(_digest(value, seen).encode())
+    _digests[obj] = h.hexdigest()
+    return _digests[obj]
+
+
+def _describe(value):
+    # JSON description of a parameter, floats by repr so nearby values get different keys
+    value = getattr(value, 'py_func', value)
+    if isinstance(value, functools.partial):
+        return {'partial': _describe(value.func), 'args': _describe(value.args), 'keywords': _describe(value.keywords)}
+    if isinstance(value, type) or hasattr(value, '__code__'):
+        return _digest(value) if _is_project(value) else f'{value.__module__}.{value.__qualname__}'
+    if isinstance(value, dict):
+        return {str(key): _describe(item) for key, item in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_describe(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return repr(value)
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    return repr(value)
+
+
+def _bytes(values):
+    values = np.ascontiguousarray(values)
+    return values.reshape(-1).view(np.uint8) if values.size else b''
+
+
+def _update_frame(h, k_lines):
+    for name in k_lines.columns:
+        column = k_lines[name]
+        h.update(f'{name}:{column.dtype}'.encode())
+        if column.dtype == object or isinstance(column.dtype, pd.api.extensions.ExtensionDtype):
+            h.update(_bytes(pd.util.hash_pandas_object(column, index=False).to_numpy()))
+        else:
+            h.update(_bytes(column.to_numpy()))
+
+
+def fingerprint(data) -> str:
+    """Content hash of klines: a DataFrame, an array from KlineStore.read or an iterable of arrays."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, pd.DataFrame):
+        _update_frame(h, data)
+    else:
+        for array in [data] if isinstance(data, np.ndarray) else data:
+            h.update(_bytes(array))
+    return h.hexdigest()
+
+
+class RunCache:
+    """Backtest results by strategy config and data fingerprint, in memory and on disk.
+
+    Entries are TradeBooks, an in-memory LRU of `max_entries` in front of .npz files under
+    root/runs evicted by least recent use like the indicator cache. A config keeps only the
+    result of the klines it last ran on, so the rolling windows of LR6.py and Залікова.py
+    replace their entry when new candles arrive instead of adding one every run.
+    """
+
+    def __init__(self, root='klines', max_entries=64, max_bytes=2 ** 28):
+        self.directory = os.path.join(root, 'runs')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+
+    @staticmethod
+    def key(config, data_fingerprint) -> str:
+        config = hashlib.blake2b(json.dumps(_describe(config), sort_keys=True).encode(), digest_size=16).hexdigest()
+        return f'{config}_{data_fingerprint}'
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        book = self._memory.get(key)
+        if book is None:
+            path = self._path(key)
+            try:
+                with np.load(path) as entry:
+                    book = TradeBook(*(entry[name] for name in BOOK_COLUMNS[:2]), entry['assets'].tolist(),
+                                     *(entry[name] for name in BOOK_COLUMNS[2:]))
+                os.utime(path)
+            except FileNotFoundError:
+                count('run_cache.miss')
+                return None
+            self._remember(key, book)
+        self._memory.move_to_end(key)
+        count('run_cache.hit')
+        return TradeBook.concat([book])
+
+    def _remember(self, key, book):
+        self._memory[key] = book
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def put(self, key, book: TradeBook):
+        # The results of the same config on other klines are out of date now
+        prefix = key.split('_', 1)[0] + '_'
+        for stale in [k for k in self._memory if k.startswith(prefix) and k != key]:
+            del self._memory[stale]
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix) and name != f'{key}.npz' and '.tmp' not in name:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+        self._remember(key, TradeBook.concat([book]))
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp, assets=np.array(book.assets, dtype=str),
+                 **{name: getattr(book, name) for name in BOOK_COLUMNS})
+        os.replace(tmp, path)
+        self.evict()
+
+    def run(self, fn, k_lines, data_fingerprint=None, **params) -> TradeBook:
+        """fn(k_lines, **params), or its stored result when fn, params and the data are unchanged.
+
+        Pass the fingerprint of k_lines to skip hashing it on every call of a loop.
+        """
+        key = self.key({'fn': fn, 'params': params}, data_fingerprint or fingerprint(k_lines))
+        book = self.get(key)
+        if book is None:
+            book = fn(k_lines, **params)
+            self.put(key, book)
+        return book
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz') or '.tmp' in name:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        self._memory.clear()
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, fields
+from exits import SIDE_BUY, SIDE_SELL, EXIT_OPEN, EXIT_LABELS
+from instrument import timed, count
+
+SIDE_NAMES = {SIDE_BUY: 'buy', SIDE_SELL: 'sell'}
+
+
+@dataclass
+class Signal:
+    time: pd.Timestamp
+    asset: str
+    quantity: float
+    side: str
+    entry: float
+    take_profit: float
+    stop_loss: float
+    result: float = None
+    closed_by: str = None
+
+
+class SignalTable:
+    """Signals as columns, Signal objects are only built when rows are accessed."""
+
+    def __init__(self, index, time, side, entry, take_profit, stop_loss, asset, quantity=100,
+                 signal_cls=Signal):
+        self.index = index
+        self.time = time
+        self.side = side
+        self.entry = entry
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.asset = asset
+        self.quantity = quantity
+        self.signal_cls = signal_cls
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        asset = self.asset if isinstance(self.asset, str) else self.asset[i]
+        values = {
+            'time': pd.Timestamp(self.time[i]) if self.time is not None else None,
+            'asset': asset,
+            'quantity': self.quantity,
+            'side': SIDE_NAMES[int(self.side[i])],
+            'entry': float(self.entry[i]),
+            'take_profit': float(self.take_profit[i]),
+            'stop_loss': float(self.stop_loss[i]),
+        }
+        # Fields the class has beyond these (result, closed_by) start empty
+        return self.signal_cls(**{field.name: values.get(field.name) for field in fields(self.signal_cls)})
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def closed(self, exits):
+        # Signals that hit TP or SL, with result and closed_by filled in from the exits
+        for i in np.flatnonzero(exits.exit_reason != EXIT_OPEN):
+            signal = self[i]
+            signal.result = float(exits.result[i])
+            signal.closed_by = EXIT_LABELS[int(exits.exit_reason[i])]
+            yield signal
+
+
+def round_prices(values, decimals) -> np.ndarray:
+    """round() of every price as the scripts did it. np.round() scales by 10 ** decimals first
+    and can land on the other side of a half, 69605.0 * 0.99 gives 68909.0 instead of 68908.9."""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0 ** decimals
+    near_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    rounded[near_half] = [round(value, decimals) for value in values[near_half].tolist()]
+    return rounded
+
+
+def _column(k_lines, name):
+    return np.asarray(k_lines[name], dtype=np.float64)
+
+
+@timed('signals')
+def make_signals(k_lines, buy, sell, take_profit, stop_loss, decimals, asset, quantity=100,
+                 signal_cls=Signal):
+    # buy/sell are row masks; take_profit/stop_loss map a side code to the price multiplier
+    buy, sell = np.asarray(buy, dtype=bool), np.asarray(sell, dtype=bool)
+    index = np.flatnonzero(buy | sell)
+    count('signals', len(index))
+    side = np.where(buy[index], SIDE_BUY, SIDE_SELL).astype(np.int8)
+    entry = _column(k_lines, 'close')[index]
+    is_buy = side == SIDE_BUY
+    time = np.asarray(k_lines['time'])[index] if 'time' in k_lines else None
+    if not isinstance(asset, str):
+        asset = np.asarray(asset)[index]
+    return SignalTable(
+        index, time, side, entry,
+        round_prices(np.where(is_buy, take_profit[SIDE_BUY], take_profit[SIDE_SELL]) * entry, decimals),
+        round_prices(np.where(is_buy, stop_loss[SIDE_BUY], stop_loss[SIDE_SELL]) * entry, decimals),
+        asset, quantity, signal_cls,
+    )
+
+
+def cci_adx_signals(k_lines, cci_long=100, cci_short=-100, adx_cond=25,
+                    take_prof_long=0.015, take_prof_short=0.015, stop_loss_long=0.01, stop_loss_short=0.01,
+                    asset='BTCUSDT', quantity=100, signal_cls=Signal):
+    # Sell when CCI is below cci_short, otherwise buy above cci_long, both need ADX above adx_cond
+    cci, adx = _column(k_lines, 'cci'), _column(k_lines, 'adx')
+    sell = (cci < cci_short) & (adx > adx_cond)
+    buy = ~sell & (cci > cci_long) & (adx > adx_cond)
+    return make_signals(
+        k_lines, buy, sell,
+        {SIDE_BUY: 1 + take_prof_long, SIDE_SELL: 1 - take_prof_short},
+        {SIDE_BUY: 1 - stop_loss_long, SIDE_SELL: 1 + stop_loss_short},
+        1, asset, quantity, signal_cls,
+    )
+
+
+def trend_signals(k_lines, rsi_buy=30, rsi_sell=70, adx_cond=20, signal_cls=Signal):
+    # The EMA/SMA/VWMA/RSI/ADX rule from Залікова.py
+    ema, sma, vwma = _column(k_lines, 'ema'), _column(k_lines, 'sma'), _column(k_lines, 'vwma')
+    rsi, adx = _column(k_lines, 'rsi'), _column(k_lines, 'adx')
+    buy = (ema > vwma) & (sma > ema) & (rsi < rsi_buy) & (adx > adx_cond)
+    sell = ~buy & (ema < vwma) & (sma < ema) & (rsi > rsi_sell) & (adx > adx_cond)
+    return make_signals(
+        k_lines, buy, sell,
+        {SIDE_BUY: 1.0215, SIDE_SELL: 0.9785},
+        {SIDE_BUY: 0.9925, SIDE_SELL: 1.0075},
+        2, k_lines['symbol'], 100, signal_cls,
+    )
@@ -0,0 +1,220 @@
+import itertools
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from exits import Exits, ExitResolver, SIDE_BUY, SIDE_SELL, EXIT_OPEN
+from indicator_cache import INDICATORS
+from signals import SignalTable, round_prices
+from tradebook import TradeBook
+from instrument import stage, timed, count
+
+# Variants of a rule whose signal masks are built together, bounds the variants x candles arrays
+VARIANT_BATCH = 16
+
+
+@dataclass
+class Rule:
+    """A family of strategies that differ only in their parameters.
+
+    indicators maps the names the rule reads to (indicator, window) from the indicator cache.
+    masks() gets those columns as (1, candles) arrays and every parameter as a (variants, 1)
+    array and returns the (variants, candles) buy and sell masks. levels() gets the parameters
+    as (variants,) arrays and returns the TP and SL price multipliers by side.
+    """
+    indicators: dict
+    defaults: dict
+    masks: object
+    levels: object
+    decimals: int
+
+
+def _cci_adx_masks(c, p):
+    # cci_adx_signals for many parameter sets
+    sell = (c['cci'] < p['cci_short']) & (c['adx'] > p['adx_cond'])
+    buy = ~sell & (c['cci'] > p['cci_long']) & (c['adx'] > p['adx_cond'])
+    return buy, sell
+
+
+def _cci_adx_levels(p):
+    return ({SIDE_BUY: 1 + p['take_prof_long'], SIDE_SELL: 1 - p['take_prof_short']},
+            {SIDE_BUY: 1 - p['stop_loss_long'], SIDE_SELL: 1 + p['stop_loss_short']})
+
+
+def _trend_masks(c, p):
+    # trend_signals for many parameter sets
+    strong = c['adx'] > p['adx_cond']
+    buy = (c['ema'] > c['vwma']) & (c['sma'] > c['ema']) & (c['rsi'] < p['rsi_buy']) & strong
+    sell = ~buy & (c['ema'] < c['vwma']) & (c['sma'] < c['ema']) & (c['rsi'] > p['rsi_sell']) & strong
+    return buy, sell
+
+
+def _trend_levels(p):
+    n = len(p['adx_cond'])
+    return ({SIDE_BUY: np.full(n, 1.0215), SIDE_SELL: np.full(n, 0.9785)},
+            {SIDE_BUY: np.full(n, 0.9925), SIDE_SELL: np.full(n, 1.0075)})
+
+
+RULES = {
+    'cci_adx': Rule({'cci': ('cci', 20), 'adx': ('adx', 14)},
+                    {'cci_long': 100, 'cci_short': -100, 'adx_cond': 25,
+                     'take_prof_long': 0.015, 'take_prof_short': 0.015, 'stop_loss_long': 0.01, 'stop_loss_short': 0.01},
+                    _cci_adx_masks, _cci_adx_levels, 1),
+    'trend': Rule({'ema': ('ema', 12), 'sma': ('sma', 40), 'vwma': ('vwma', 12), 'rsi': ('rsi', 40), 'adx': ('adx', 40)},
+                  {'rsi_buy': 30, 'rsi_sell': 70, 'adx_cond': 20},
+                  _trend_masks, _trend_levels, 2),
+}
+
+
+@dataclass
+class Strategy:
+    name: str
+    rule: str
+    params: dict = field(default_factory=dict)
+
+    def parameters(self):
+        return {**RULES[self.rule].defaults, **self.params}
+
+
+STRATEGIES = {}
+
+
+def strategy(name, rule, **params) -> Strategy:
+    if rule not in RULES:
+        raise ValueError(f"Unknown rule {rule!r}, expected one of {', '.join(RULES)}")
+    unknown = set(params) - set(RULES[rule].defaults)
+    if unknown:
+        raise ValueError(f"{rule} has no parameters {', '.join(sorted(unknown))}")
+    return Strategy(name, rule, params)
+
+
+def register(name, rule, **params) -> Strategy:
+    STRATEGIES[name] = strategy(name, rule, **params)
+    return STRATEGIES[name]
+
+
+# The strategies of the scripts
+register('LR5', 'cci_adx', take_prof_long=0.1, take_prof_short=0.1, stop_loss_long=0.02, stop_loss_short=0.02)
+register('LR6', 'cci_adx')
+register('Залікова', 'trend')
+
+
+def variants(base, **grid) -> list:
+    """Copies of `base` with every combination of the grid values, named like LR6[adx_cond=20]."""
+    base = STRATEGIES[base] if isinstance(base, str) else base
+    keys = list(grid)
+    return [strategy(f"{base.name}[{','.join(f'{k}={v}' for k, v in zip(keys, values))}]", base.rule,
+                     **{**base.params, **dict(zip(keys, values))})
+            for values in itertools.product(*grid.values())]
+
+
+def indicator_columns(k_lines, specs, indicator_cache=None, symbol=None, interval=None) -> dict:
+    # Every (indicator, window) once, from the indicator cache when one is given
+    values = {}
+    for name, window in sorted(set(specs)):
+        if indicator_cache is not None:
+            values[name, window] = indicator_cache.get(symbol, interval, k_lines, name, window)
+        else:
+            with stage(f'indicator.{name}'):
+                values[name, window] = np.asarray(INDICATORS[name](k_lines, window), dtype=np.float64)
+    return values
+
+
+def _rule_signals(rule, columns, strategies, close, batch):
+    # (strategy, candle) of every signal in strategy order, then its side and price levels
+    for lo in range(0, len(strategies), batch):
+        chunk = strategies[lo:lo + batch]
+        params = {key: np.array([s.parameters()[key] for s in chunk], dtype=np.float64) for key in rule.defaults}
+        buy, sell = rule.masks(columns, {key: values[:, None] for key, values in params.items()})
+        row, index = np.nonzero(buy | sell)
+        side = np.where(buy[row, index], SIDE_BUY, SIDE_SELL).astype(np.int8)
+        entry = close[index]
+        is_buy = side == SIDE_BUY
+        take_profit, stop_loss = rule.levels(params)
+        yield (row + lo, index, side, entry,
+               round_prices(np.where(is_buy, take_profit[SIDE_BUY][row], take_profit[SIDE_SELL][row]) * entry, rule.decimals),
+               round_prices(np.where(is_buy, stop_loss[SIDE_BUY][row], stop_loss[SIDE_SELL][row]) * entry, rule.decimals))
+
+
+def _distinct(index, side, take_profit, stop_loss):
+    # First row of every distinct (candle, side, TP, SL) and the distinct row of each row
+    order = np.lexsort((stop_loss, take_profit, side, index))
+    changed = np.zeros(len(order), dtype=bool)
+    changed[:1] = True
+    for column in (index, side, take_profit, stop_loss):
+        changed[1:] |= column[order][1:] != column[order][:-1]
+    group = np.empty(len(order), dtype=np.int64)
+    group[order] = np.cumsum(changed) - 1
+    return order[changed], group
+
+
+@timed('strategies')
+def run_strategies(k_lines: pd.DataFrame, strategies=None, asset='BTCUSDT', indicator_cache=None, interval=None,
+                   batch=VARIANT_BATCH) -> dict:
+    """Trades of every strategy (all registered ones by default) from one pass over the klines.
+
+    The indicators the strategies need are computed once, the signals of a rule come from
+    masks built for `batch` variants at a time, and the exits of all distinct signals are
+    resolved in one ExitResolver call. The books are the same as each script's perform_backtesting.
+    """
+    strategies = list(STRATEGIES.values()) if strategies is None else list(strategies)
+    names = [s.name for s in strategies]
+    if len(set(names)) != len(names):
+        raise ValueError("Strategy names have to be unique")
+    values = indicator_columns(k_lines, [spec for s in strategies for spec in RULES[s.rule].indicators.values()],
+                               indicator_cache, asset, interval)
+    close = np.asarray(k_lines['close'], dtype=np.float64)
+
+    parts = []
+    with stage('signals'):
+        for rule_name, rule in RULES.items():
+            positions = np.array([i for i, s in enumerate(strategies) if s.rule == rule_name], dtype=np.int64)
+            if not len(positions):
+                continue
+            columns = {role: values[spec][None, :] for role, spec in rule.indicators.items()}
+            for row, *rest in _rule_signals(rule, columns, [strategies[i] for i in positions], close, batch):
+                parts.append((positions[row], *rest))
+    columns = [np.concatenate(column) for column in zip(*parts)] if parts else \
+        [np.empty(0, dtype=dtype) for dtype in (np.int64, np.int64, np.int8, np.float64, np.float64, np.float64)]
+    # Rows of a strategy together, still in candle order
+    order = np.argsort(columns[0], kind='stable')
+    owner, index, side, entry, take_profit, stop_loss = (column[order] for column in columns)
+    count('signals', len(index))
+
+    time = np.asarray(k_lines['time'])[index] if 'time' in k_lines else None
+    signals = SignalTable(index, time, side, entry, take_profit, stop_loss, asset)
+    # Variants mostly signal on the same candles with the same levels, those exits are found once
+    first, group = _distinct(index, side, take_profit, stop_loss)
+    distinct = ExitResolver(k_lines['high'], k_lines['low']).resolve(
+        index[first], side[first], entry[first], take_profit[first], stop_loss[first])
+    exits = Exits(distinct.exit_index[group], distinct.exit_reason[group], distinct.result[group])
+    bounds = np.searchsorted(owner, np.arange(len(strategies) + 1))
+    closed = exits.exit_reason != EXIT_OPEN
+    return {name: TradeBook.from_exits(signals, exits, rows=lo + np.flatnonzero(closed[lo:hi]))
+            for name, lo, hi in zip(names, bounds[:-1], bounds[1:])}
+
+
+def evaluate(k_lines: pd.DataFrame, strategies=None, **kwargs) -> pd.DataFrame:
+    """One row per strategy: its rule, parameters and TradeBook statistics."""
+    strategies = list(STRATEGIES.values()) if strategies is None else list(strategies)
+    books = run_strategies(k_lines, strategies, **kwargs)
+    rows = {s.name: {'rule': s.rule, **s.parameters(), **books[s.name].statistics()} for s in strategies}
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def main():
+    from binance import Client
+    from kline_store import KlineStore
+    from indicator_cache import IndicatorCache
+
+    store = KlineStore(client=Client())
+    k_lines = store.load("BTCUSDT", Client.KLINE_INTERVAL_1MINUTE, "1 week ago UTC", "now UTC")
+
+    # The scripts' strategies next to a grid around LR6, all from one load of the klines
+    strategies = list(STRATEGIES.values()) + variants('LR6', adx_cond=[15, 20, 25, 30, 35],
+                                                      cci_long=[50, 100], cci_short=[-50, -100, -150, -200, -250])
+    table = evaluate(k_lines, strategies, indicator_cache=IndicatorCache(), interval=Client.KLINE_INTERVAL_1MINUTE)
+    print(table.sort_values('total_pnl', ascending=False).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+from collections import deque
+
+# Indicators that take one candle at a time and keep only the state they need.
+# update() returns the new value, or None while the indicator is still warming up,
+# at the same positions where the ta library returns NaN or its zero padding.
+
+
+class RollingSum:
+    """Sum of the last `window` values with Neumaier compensation against drift."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self._compensation = 0.0
+
+    def _add(self, x):
+        total = self.total + x
+        if abs(self.total) >= abs(x):
+            self._compensation += (self.total - total) + x
+        else:
+            self._compensation += (x - total) + self.total
+        self.total = total
+
+    def update(self, x):
+        self.values.append(x)
+        self._add(x)
+        if len(self.values) > self.window:
+            self._add(-self.values.popleft())
+        return self.total + self._compensation
+
+    @property
+    def full(self):
+        return len(self.values) == self.window
+
+
+class SMA:
+    def __init__(self, window):
+        self.window = window
+        self._sum = RollingSum(window)
+        self.value = None
+
+    def update(self, close):
+        total = self._sum.update(close)
+        self.value = total / self.window if self._sum.full else None
+        return self.value
+
+
+class EMA:
+    def __init__(self, window=None, alpha=None):
+        # Same as pandas ewm(span=window, adjust=False) or ewm(alpha=alpha, adjust=False)
+        self.window = window
+        self.alpha = alpha if alpha is not None else 2 / (window + 1)
+        self.min_periods = window or 1
+        self.count = 0
+        self.mean = None
+        self.value = None
+
+    def update(self, x):
+        self.count += 1
+        if self.mean is None:
+            self.mean = x
+        else:
+            self.mean = (1 - self.alpha) * self.mean + self.alpha * x
+        self.value = self.mean if self.count >= self.min_periods else None
+        return self.value
+
+
+class RSI:
+    """Wilder RSI as in ta.momentum.RSIIndicator."""
+
+    def __init__(self, window=14):
+        self.window = window
+        self._up = EMA(window, alpha=1 / window)
+        self._down = EMA(window, alpha=1 / window)
+        self._prev = None
+        self.value = None
+
+    def update(self, close):
+        diff = close - self._prev if self._prev is not None else 0.0
+        self._prev = close
+        up = self._up.update(diff if diff > 0 else 0.0)
+        down = self._down.update(-diff if diff < 0 else 0.0)
+        if up is None:
+            self.value = None
+        elif down == 0:
+            self.value = 100.0
+        else:
+            self.value = 100 - 100 / (1 + up / down)
+        return self.value
+
+
+class SimpleRSI:
+    """RSI over simple rolling means, calculate_rsi in LR2.py."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._gains = RollingSum(period)
+        self._losses = RollingSum(period)
+        self._prev = None
+        self.value = None
+
+    def update(self, close):
+        delta = close - self._prev if self._prev is not None else 0.0
+        self._prev = close
+        count = min(len(self._gains.values) + 1, self.period)
+        avg_gain = self._gains.update(delta if delta > 0 else 0.0) / count
+        avg_loss = self._losses.update(-delta if delta < 0 else 0.0) / count
+        if avg_loss == 0:
+            self.value = 100.0 if avg_gain > 0 else None
+        else:
+            self.value = 100 - 100 / (1 + avg_gain / avg_loss)
+        return self.value
+
+
+class CCI:
+    """Commodity Channel Index, O(window) per candle for the mean deviation."""
+
+    def __init__(self, window=20, constant=0.015):
+        self.window = window
+        self.constant = constant
+        self._typical = deque(maxlen=window)
+        self.value = None
+
+    def update(self, high, low, close):
+        typical_price = (high + low + close) / 3.0
+        self._typical.append(typical_price)
+        if len(self._typical) < self.window:
+            self.value = None
+            return None
+        mean = sum(self._typical) / self.window
+        mad = sum(abs(x - mean) for x in self._typical) / self.window
+        self.value = (typical_price - mean) / (self.constant * mad) if mad else None
+        return self.value
+
+
+class ATR:
+    """Average True Range with Wilder smoothing as in ta.volatility.AverageTrueRange."""
+
+    def __init__(self, window=14):
+        self.window = window
+        self.count = 0
+        self._prev_close = None
+        self._seed = 0.0
+        self.value = None
+
+    def update(self, high, low, close):
+        true_range = high - low
+        if self._prev_close is not None:
+            true_range = max(true_range, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self.count += 1
+        if self.count < self.window:
+            self._seed += true_range
+        elif self.count == self.window:
+            self.value = (self._seed + true_range) / self.window
+        else:
+            self.value = (self.value * (self.window - 1) + true_range) / self.window
+        return self.value
+
+
+class ADX:
+    """Average Directional Index following ta.trend.ADXIndicator.
+
+    ta zeroes the smoothed true range on the very last row of its input, so its final
+    ADX value differs from this one, every earlier row matches.
+    """
+
+    def __init__(self, window=14):
+        self.window = window
+        self.count = 0
+        self._prev = None
+        self._trs = self._dip = self._din = 0.0
+        self._dx_seed = 0.0
+        self.value = None
+
+    def _dx(self):
+        if self._trs == 0:
+            return 0.0
+        dip = 100 * (self._dip / self._trs)
+        din = 100 * (self._din / self._trs)
+        return 100 * abs((dip - din) / (dip + din)) if dip + din != 0 else 0.0
+
+    def update(self, high, low, close):
+        prev, self._prev = self._prev, (high, low, close)
+        self.count += 1
+        if prev is None:
+            return None
+        prev_high, prev_low, prev_close = prev
+        true_range = max(high, prev_close) - min(low, prev_close)
+        up, down = high - prev_high, prev_low - low
+        pos = up if up > down and up > 0 else 0.0
+        neg = down if down > up and down > 0 else 0.0
+
+        w = self.window
+        row = self.count - 1
+        if row <= w:
+            self._trs += true_range
+            self._dip += pos
+            self._din += neg
+            if row < w:
+                return None
+        else:
+            self._trs = self._trs - self._trs / w + true_range
+            self._dip = self._dip - self._dip / w + pos
+            self._din = self._din - self._din / w + neg
+
+        dx = self._dx()
+        if row < 2 * w - 1:
+            self._dx_seed += dx
+        elif row == 2 * w - 1:
+            self.value = (self._dx_seed + dx) / w
+        else:
+            self.value = (self.value * (w - 1) + dx) / w
+        return self.value
+
+
+class MACD:
+    """MACD line, signal line and histogram as in ta.trend.MACD."""
+
+    def __init__(self, window_slow=26, window_fast=12, window_sign=9):
+        self._fast = EMA(window_fast)
+        self._slow = EMA(window_slow)
+        self._signal = EMA(window_sign)
+        self.value = None
+
+    def update(self, close):
+        fast, slow = self._fast.update(close), self._slow.update(close)
+        if fast is None or slow is None:
+            self.value = None
+            return None
+        macd = fast - slow
+        signal = self._signal.update(macd)
+        self.value = (macd, signal, macd - signal if signal is not None else None)
+        return self.value
+
+
+class VWMA:
+    """Rolling volume weighted average of the typical price, ta.volume.VolumeWeightedAveragePrice."""
+
+    def __init__(self, window=14):
+        self.window = window
+        self._price_volume = RollingSum(window)
+        self._volume = RollingSum(window)
+        self.value = None
+
+    def update(self, high, low, close, volume):
+        typical_price = (high + low + close) / 3.0
+        price_volume = self._price_volume.update(typical_price * volume)
+        total_volume = self._volume.update(volume)
+        self.value = price_volume / total_volume if self._volume.full and total_volume else None
+        return self.value
@@ -0,0 +1,49 @@
+import numpy as np
+from fetcher import INTERVAL_MS
+from kline_store import to_ms
+from klines import KLINE_DTYPE, to_frame
+
+
+def synthetic_klines(n, seed=0, start='2024-01-01', interval='1m', price=30_000.0, drift=0.0,
+                     volatility=0.0008) -> np.ndarray:
+    """Candles following geometric Brownian motion, the same array for the same seed.
+
+    Each candle opens at the previous close. The wicks reach past the body by a
+    half-normal amount scaled by the volatility. Volume and trade counts grow with
+    the size of the move. Prices are rounded to a 0.01 tick.
+    """
+    rng = np.random.default_rng(seed)
+    step = INTERVAL_MS[interval]
+    returns = rng.normal(drift - volatility ** 2 / 2, volatility, n)
+    close = price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate([[price], close[:-1]])
+    wicks = np.abs(rng.normal(0, volatility / 2, (2, n)))
+
+    array = np.empty(n, dtype=KLINE_DTYPE)
+    array['open_time'] = to_ms(start) + step * np.arange(n, dtype=np.int64)
+    array['close_time'] = array['open_time'] + step - 1
+    array['open'] = np.round(open_, 2)
+    array['close'] = np.round(close, 2)
+    array['high'] = np.round(np.maximum(open_, close) * np.exp(wicks[0]), 2)
+    array['low'] = np.round(np.minimum(open_, close) * np.exp(-wicks[1]), 2)
+    volume = np.round(rng.lognormal(0, 0.5, n) * (1 + 50 * np.abs(returns) / volatility), 5)
+    array['volume'] = volume
+    array['quote_asset_volume'] = np.round(volume * array['close'], 2)
+    array['number_of_trades'] = rng.poisson(volume * 40)
+    taker = rng.uniform(0.3, 0.7, n)
+    array['taker_buy_base_asset_volume'] = np.round(volume * taker, 5)
+    array['taker_buy_quote_asset_volume'] = np.round(volume * taker * array['close'], 2)
+    return array
+
+
+def synthetic_frame(n, seed=0, **kwargs):
+    return to_frame(synthetic_klines(n, seed, **kwargs))
+
+
+def synthetic_rows(array):
+    # The same candles as get_historical_klines returns them, prices and volumes as strings
+    rows = []
+    for k in array.tolist():
+        rows.append([k[0], f'{k[1]:.2f}', f'{k[2]:.2f}', f'{k[3]:.2f}', f'{k[4]:.2f}', f'{k[5]:.5f}', k[6],
+                     f'{k[7]:.2f}', k[8], f'{k[9]:.5f}', f'{k[10]:.2f}', '0'])
+    return rows
@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+from exits import EXIT_OPEN, EXIT_TP, EXIT_SL, EXIT_LABELS
+from signals import SIDE_NAMES
+from instrument import timed, count
+
+SIDE_CODES = {name: code for code, name in SIDE_NAMES.items()}
+EXIT_CODES = {'TP': EXIT_TP, 'SL': EXIT_SL, None: EXIT_OPEN}
+
+
+class Trade:
+    """Read-only Signal-like view of one row of a TradeBook."""
+
+    __slots__ = ('_book', '_i')
+
+    def __init__(self, book, i):
+        self._book = book
+        self._i = i
+
+    @property
+    def time(self):
+        return pd.Timestamp(self._book.time[self._i])
+
+    @property
+    def asset(self):
+        return self._book.assets[self._book.asset[self._i]]
+
+    @property
+    def quantity(self):
+        # Signals are created with whole quantities such as 100
+        quantity = float(self._book.quantity[self._i])
+        return int(quantity) if quantity.is_integer() else quantity
+
+    @property
+    def side(self):
+        return SIDE_NAMES[int(self._book.side[self._i])]
+
+    @property
+    def entry(self):
+        return float(self._book.entry[self._i])
+
+    @property
+    def take_profit(self):
+        return float(self._book.take_profit[self._i])
+
+    @property
+    def stop_loss(self):
+        return float(self._book.stop_loss[self._i])
+
+    @property
+    def result(self):
+        return float(self._book.result[self._i])
+
+    @property
+    def closed_by(self):
+        return EXIT_LABELS[int(self._book.exit_reason[self._i])]
+
+    def __repr__(self):
+        return (f"Trade(time={self.time!r}, asset={self.asset!r}, quantity={self.quantity!r}, side={self.side!r}, "
+                f"entry={self.entry!r}, take_profit={self.take_profit!r}, stop_loss={self.stop_loss!r}, "
+                f"result={self.result!r}, closed_by={self.closed_by!r})")
+
+
+class TradeBook:
+    """Closed trades as typed arrays: int64 time in ns, float64 prices, int8 side and exit codes."""
+
+    def __init__(self, time, asset, assets, quantity, side, entry, take_profit, stop_loss, result, exit_reason):
+        self.time = np.asarray(time, dtype='datetime64[ns]').astype(np.int64)
+        self.asset = np.asarray(asset, dtype=np.int16)
+        self.assets = list(assets)
+        self.quantity = np.asarray(quantity, dtype=np.float64)
+        self.side = np.asarray(side, dtype=np.int8)
+        self.entry = np.asarray(entry, dtype=np.float64)
+        self.take_profit = np.asarray(take_profit, dtype=np.float64)
+        self.stop_loss = np.asarray(stop_loss, dtype=np.float64)
+        self.result = np.asarray(result, dtype=np.float64)
+        self.exit_reason = np.asarray(exit_reason, dtype=np.int8)
+
+    @classmethod
+    @timed('trades')
+    def from_exits(cls, signals, exits, rows=None, quantity=None, result=None):
+        # rows picks the signals to keep (all closed ones by default), quantity/result replace theirs
+        closed = np.flatnonzero(exits.exit_reason != EXIT_OPEN) if rows is None else np.asarray(rows, dtype=np.int64)
+        count('trades', len(closed))
+        if isinstance(signals.asset, str):
+            assets, asset = [signals.asset], np.zeros(len(closed), dtype=np.int16)
+        else:
+            assets, asset = np.unique(np.asarray(signals.asset)[closed], return_inverse=True)
+        if signals.time is not None:
+            time = signals.time[closed]
+        else:
+            time = np.full(len(closed), np.datetime64('NaT'), dtype='datetime64[ns]')
+        return cls(
+            time, asset, assets,
+            np.full(len(closed), signals.quantity, dtype=np.float64) if quantity is None else quantity,
+            signals.side[closed], signals.entry[closed], signals.take_profit[closed], signals.stop_loss[closed],
+            exits.result[closed] if result is None else result, exits.exit_reason[closed],
+        )
+
+    @classmethod
+    @timed('trades')
+    def from_signals(cls, trade_list):
+        count('trades', len(trade_list))
+        assets, asset = np.unique([trade.asset for trade in trade_list], return_inverse=True)
+        return cls(
+            [trade.time for trade in trade_list], asset, assets,
+            [trade.quantity for trade in trade_list],
+            [SIDE_CODES[trade.side] for trade in trade_list],
+            [trade.entry for trade in trade_list],
+            [trade.take_profit for trade in trade_list],
+            [trade.stop_loss for trade in trade_list],
+            [trade.result for trade in trade_list],
+            [EXIT_CODES[getattr(trade, 'closed_by', None)] for trade in trade_list],
+        )
+
+    @classmethod
+    def concat(cls, books):
+        assets = sorted({asset for book in books for asset in book.assets})
+        codes = {asset: code for code, asset in enumerate(assets)}
+
+        def column(name):
+            return np.concatenate([getattr(book, name) for book in books]) if books else []
+
+        asset = np.concatenate([np.array([codes[a] for a in book.assets], dtype=np.int16)[book.asset]
+                                for book in books]) if books else []
+        return cls(
+            column('time').astype('datetime64[ns]') if books else [], asset, assets, column('quantity'),
+            column('side'), column('entry'), column('take_profit'), column('stop_loss'),
+            column('result'), column('exit_reason'),
+        )
+
+    def __len__(self):
+        return len(self.result)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Trade(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Trade(self, i)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in
+                   ('time', 'asset', 'quantity', 'side', 'entry', 'take_profit', 'stop_loss', 'result', 'exit_reason'))
+
+    @staticmethod
+    def _sum(values):
+        # Summed in trade order, so the total is the same as sum() over the trades
+        return float(np.cumsum(values)[-1]) if len(values) else 0.0
+
+    def pnl(self):
+        return self._sum(self.result)
+
+    def gross_profit(self):
+        return self._sum(self.result[self.result > 0])
+
+    def gross_loss(self):
+        return -self._sum(self.result[self.result < 0])
+
+    def profit_factor(self):
+        total_loss = self.gross_loss()
+        return self.gross_profit() / total_loss if total_loss > 0 else float('inf')
+
+    def win_rate(self):
+        return float(np.count_nonzero(self.result > 0) / len(self)) if len(self) else 0
+
+    def meets_criteria(self, min_pnl=0.5, min_win_rate=0.4, min_profit_factor=1.3):
+        # Profitability thresholds from calculate_statistics in Залікова.py
+        return self.pnl() > min_pnl and self.win_rate() > min_win_rate and self.profit_factor() > min_profit_factor
+
+    @timed('statistics')
+    def statistics(self):
+        return {
+            'total_trades': len(self),
+            'total_pnl': self.pnl(),
+            'win_rate': self.win_rate(),
+            'profit_factor': self.profit_factor(),
+            'average_result': float(self.result.mean()) if len(self) else 0.0,
+            'tp_exits': int(np.count_nonzero(self.exit_reason == EXIT_TP)),
+            'sl_exits': int(np.count_nonzero(self.exit_reason == EXIT_SL)),
+            'meets_criteria': self.meets_criteria(),
+        }
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'time': self.time.astype('datetime64[ns]'),
+            'asset': np.asarray(self.assets, dtype=object)[self.asset] if len(self) else [],
+            'quantity': self.quantity,
+            'side': np.where(self.side == SIDE_CODES['buy'], 'buy', 'sell'),
+            'entry': self.entry,
+            'take_profit': self.take_profit,
+            'stop_loss': self.stop_loss,
+            'result': self.result,
+            'closed_by': np.where(self.exit_reason == EXIT_TP, 'TP', 'SL'),
+        })
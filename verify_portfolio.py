@@ -0,0 +1,73 @@
+import numpy as np
+from exits import SIDE_BUY
+from indicator_cache import INDICATORS
+from portfolio import simulate
+from signals import cci_adx_signals
+from synthetic import synthetic_frame
+
+
+def _exits(candidates, candle, high, low, signals, slippage, fee, taken, positions=None):
+    # Closes the candidates whose TP or SL this candle reaches and returns their P&L
+    positions = candidates if positions is None else positions
+    realised = 0.0
+    for position in list(candidates):
+        j, sign, entry_fill, size = position
+        up, down = (high[candle] >= signals.take_profit[j], low[candle] <= signals.stop_loss[j]) if sign > 0 \
+            else (low[candle] <= signals.take_profit[j], high[candle] >= signals.stop_loss[j])
+        if not (up or down):
+            continue
+        # TP is checked before SL on the same candle
+        exit_fill = (signals.take_profit[j] if up else signals.stop_loss[j]) * (1 - sign * slippage)
+        result = (sign * (exit_fill - entry_fill) - fee * (entry_fill + exit_fill)) * size
+        taken.append((j, size, result))
+        positions.remove(position)
+        realised += result
+    return realised
+
+
+def brute_force(k_lines, signals, max_positions=1, cooldown=0, capital=10_000.0, position_size=0.1,
+                fee=0.001, slippage=0.0005):
+    # portfolio.simulate candle by candle, each open position checks every candle for its own TP/SL
+    high, low = k_lines['high'].to_numpy(), k_lines['low'].to_numpy()
+    at = {int(index): i for i, index in enumerate(signals.index)}
+    equity, curve, last_entry = capital, [], None
+    positions, taken = [], []
+    for candle in range(len(k_lines)):
+        # Positions that exit on this candle are closed before its entry, which checks it too
+        equity += _exits(positions, candle, high, low, signals, slippage, fee, taken)
+        i = at.get(candle)
+        if i is not None and len(positions) < max_positions and equity > 0 \
+                and (last_entry is None or candle - last_entry > cooldown):
+            sign = 1.0 if signals.side[i] == SIDE_BUY else -1.0
+            entry_fill = signals.entry[i] * (1 + sign * slippage)
+            positions.append([i, sign, entry_fill, equity * position_size / entry_fill])
+            last_entry = candle
+            equity += _exits(positions[-1:], candle, high, low, signals, slippage, fee, taken, positions)
+        curve.append(equity)
+    taken.sort()
+    return taken, np.array(curve), len(positions)
+
+
+def compare(name, k_lines, signals, **kwargs):
+    portfolio = simulate(k_lines, signals, **kwargs)
+    taken, curve, still_open = brute_force(k_lines, signals, **kwargs)
+    book = portfolio.book
+    # Exits on the same candle add up to equity in another order, sizes can differ in the last bits
+    rows = np.array([t[0] for t in taken], dtype=np.int64)
+    same_signals = np.array_equal(book.time, np.asarray(signals.time, dtype='datetime64[ns]')[rows].astype(np.int64))
+    quantity = np.max(np.abs(book.quantity / [t[1] for t in taken] - 1)) if len(taken) else 0.0
+    result = np.max(np.abs(book.result - [t[2] for t in taken])) if len(taken) else 0.0
+    diff = np.max(np.abs(portfolio.equity - curve)) if len(curve) else 0.0
+    print(f"{name:<22} trades {len(book):>5}  same signals: {same_signals}  quantity rel diff {quantity:.1e}  "
+          f"result diff {result:.1e}  equity diff {diff:.1e}  still open {portfolio.still_open} / {still_open}  "
+          f"max drawdown {portfolio.max_drawdown():.4f}")
+
+
+if __name__ == "__main__":
+    k = synthetic_frame(20_000, 7)
+    k['adx'], k['cci'] = INDICATORS['adx'](k, 14), INDICATORS['cci'](k, 20)
+    signals = cci_adx_signals(k, take_prof_long=0.004, take_prof_short=0.004, stop_loss_long=0.003, stop_loss_short=0.003)
+    compare('one position', k, signals)
+    compare('three positions', k, signals, max_positions=3)
+    compare('cooldown 30', k, signals, max_positions=2, cooldown=30)
+    compare('all in, costly fills', k, signals, max_positions=4, position_size=1.0, fee=0.01, slippage=0.01)
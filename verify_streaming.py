@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import ta
+from streaming import SMA, EMA, RSI, SimpleRSI, CCI, ATR, ADX, MACD, VWMA
+
+
+def synthetic_klines(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    spread = np.abs(rng.normal(0, 0.001, (2, n)))
+    return pd.DataFrame({
+        'high': close * (1 + spread[0]),
+        'low': close * (1 - spread[1]),
+        'close': close,
+        'volume': rng.uniform(1, 10, n),
+    })
+
+
+def lr2_rsi(prices, period):
+    # calculate_rsi from LR2.py
+    deltas = prices.diff()
+    gains = deltas.where(deltas > 0, 0)
+    losses = -deltas.where(deltas < 0, 0)
+    avg_gain = gains.rolling(window=period, min_periods=1).mean()
+    avg_loss = losses.rolling(window=period, min_periods=1).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+
+def stream(indicator, k_lines, columns, pick=None):
+    values = []
+    for row in zip(*(k_lines[column] for column in columns)):
+        value = indicator.update(*row)
+        if pick is not None and value is not None:
+            value = value[pick]
+        values.append(np.nan if value is None else value)
+    return np.array(values)
+
+
+def compare(name, streamed, expected, warmup=0):
+    expected = np.asarray(expected, dtype=np.float64).copy()
+    expected[:warmup] = np.nan
+    diff = np.nanmax(np.abs(streamed - expected))
+    same_nan = np.array_equal(np.isnan(streamed), np.isnan(expected))
+    print(f"{name:<12} max abs diff {diff:.3e}  warm-up matches: {same_nan}")
+
+
+if __name__ == "__main__":
+    k = synthetic_klines()
+    hlc = ['high', 'low', 'close']
+    compare('SMA 40', stream(SMA(40), k, ['close']), ta.trend.SMAIndicator(k['close'], 40).sma_indicator())
+    compare('EMA 12', stream(EMA(12), k, ['close']), ta.trend.EMAIndicator(k['close'], 12).ema_indicator())
+    compare('RSI 40', stream(RSI(40), k, ['close']), ta.momentum.RSIIndicator(k['close'], 40).rsi())
+    compare('LR2 RSI 14', stream(SimpleRSI(14), k, ['close']), lr2_rsi(k['close'], 14))
+    compare('CCI 20', stream(CCI(20), k, hlc), ta.trend.CCIIndicator(k['high'], k['low'], k['close'], 20).cci())
+    # ta pads the warm-up of ATR and ADX with zeros instead of NaN
+    compare('ATR 14', stream(ATR(14), k, hlc), ta.volatility.AverageTrueRange(k['high'], k['low'], k['close'], 14).average_true_range(), 13)
+    # ta zeroes the last smoothed row of ADX, so its final value is left out
+    adx = stream(ADX(40), k, hlc)
+    compare('ADX 40', adx[:-1], ta.trend.ADXIndicator(k['high'], k['low'], k['close'], 40).adx()[:-1], 79)
+    macd = ta.trend.MACD(k['close'])
+    compare('MACD', stream(MACD(), k, ['close'], 0), macd.macd())
+    compare('MACD signal', stream(MACD(), k, ['close'], 1), macd.macd_signal())
+    compare('VWMA 12', stream(VWMA(12), k, hlc + ['volume']), ta.volume.VolumeWeightedAveragePrice(k['high'], k['low'], k['close'], k['volume'], 12).volume_weighted_average_price())
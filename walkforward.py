@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from exits import EXIT_OPEN, resolve_signals
+
+STAT_COLUMNS = ['trades', 'pnl', 'win_rate', 'profit_factor', 'meets_criteria']
+
+
+def rolling_windows(n, train, test, step=None):
+    """(train_start, test_start, test_end) candle offsets, the test window follows its train window."""
+    step = step or test
+    return [(lo, lo + train, lo + train + test) for lo in range(0, n - train - test + 1, step)]
+
+
+def precompute(k_lines, strategy, param_sets):
+    """Entry candle, exit candle and result of every closed trade for each parameter set,
+    over the whole series.
+
+    Returns a (3, total) float64 array, entry index, exit index and result rows with the
+    trades of all parameter sets one after another, and the offset where each set starts.
+    """
+    parts, offsets = [], [0]
+    for params in param_sets:
+        signals = strategy(k_lines, **params)
+        exits = resolve_signals(k_lines, signals)
+        closed = exits.exit_reason != EXIT_OPEN
+        parts.append(np.vstack([np.asarray(signals.index, dtype=np.float64)[closed],
+                                exits.exit_index[closed].astype(np.float64), exits.result[closed]]))
+        offsets.append(offsets[-1] + int(closed.sum()))
+    return (np.hstack(parts) if parts else np.empty((3, 0))), offsets
+
+
+def statistics(result, min_pnl=0.5, min_win_rate=0.4, min_profit_factor=1.3):
+    # Same rules as TradeBook.statistics and meets_criteria
+    pnl = float(np.cumsum(result)[-1]) if len(result) else 0.0
+    win_rate = float(np.count_nonzero(result > 0) / len(result)) if len(result) else 0
+    loss = -float(np.cumsum(result[result < 0])[-1]) if np.any(result < 0) else 0.0
+    gain = float(np.cumsum(result[result > 0])[-1]) if np.any(result > 0) else 0.0
+    profit_factor = gain / loss if loss > 0 else float('inf')
+    meets = pnl > min_pnl and win_rate > min_win_rate and profit_factor > min_profit_factor
+    return [len(result), pnl, win_rate, profit_factor, meets]
+
+
+# Per-process state, set once by _init_worker
+_trades = None
+_offsets = None
+_shm = None
+
+
+def _set_trades(trades, offsets):
+    global _trades, _offsets
+    _trades, _offsets = trades, offsets
+
+
+def _init_worker(name, total, offsets):
+    global _shm
+    _shm = shared_memory.SharedMemory(name=name)
+    _set_trades(np.ndarray((3, total), dtype=np.float64, buffer=_shm.buf), offsets)
+
+
+def _trades_between(p, start, end, exit_before=None):
+    # Trades are in entry order, so a window is a slice and no data is copied
+    index = _trades[0, _offsets[p]:_offsets[p + 1]]
+    lo, hi = np.searchsorted(index, [start, end], side='left')
+    result = _trades[2, _offsets[p] + lo:_offsets[p] + hi]
+    if exit_before is not None:
+        result = result[_trades[1, _offsets[p] + lo:_offsets[p] + hi] < exit_before]
+    return result
+
+
+def _run_window(window):
+    train_start, test_start, test_end = window
+    # Train trades still open at the test start would let later prices pick the parameters
+    train = [statistics(_trades_between(p, train_start, test_start, exit_before=test_start))
+             for p in range(len(_offsets) - 1)]
+    # Parameters with the best train P&L go on to the test window
+    best = max(range(len(train)), key=lambda p: train[p][1])
+    return [*window, best, *train[best], *statistics(_trades_between(best, test_start, test_end))]
+
+
+def walk_forward(k_lines, strategy, train, test, step=None, param_sets=None, workers=None):
+    """Statistics of rolling train/test windows, signals and exits computed once over the whole series.
+
+    A train window only counts the trades that are entered and closed before its test window
+    starts. A test trade belongs to the window it is entered in, even if it exits after the
+    window ends.
+    """
+    param_sets = param_sets or [{}]
+    windows = rolling_windows(len(k_lines), train, test, step)
+    trades, offsets = precompute(k_lines, strategy, param_sets)
+
+    total = trades.shape[1]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, trades.nbytes))
+    try:
+        shared = np.ndarray(trades.shape, dtype=np.float64, buffer=shm.buf)
+        shared[:] = trades
+        if workers == 1:
+            _set_trades(shared, offsets)
+            rows = list(map(_run_window, windows))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shm.name, total, offsets)) as executor:
+                rows = list(executor.map(_run_window, windows, chunksize=max(1, len(windows) // 64)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    columns = (['train_start', 'test_start', 'test_end', 'params']
+               + [f'train_{name}' for name in STAT_COLUMNS] + [f'test_{name}' for name in STAT_COLUMNS])
+    table = pd.DataFrame(rows, columns=columns)
+    table['params'] = [param_sets[p] for p in table['params']]
+    if 'time' in k_lines:
+        table.insert(3, 'test_time', np.asarray(k_lines['time'])[table['test_start'].to_numpy(dtype=np.int64)])
+    return table
+
+
+def stability(table):
+    """How the test statistics vary across windows."""
+    test = table[[f'test_{name}' for name in STAT_COLUMNS]].astype(np.float64).replace(np.inf, np.nan)
+    summary = test.agg(['mean', 'std', 'min', 'max']).T
+    summary['positive_windows'] = (test > 0).mean().values
+    return summary
+
+
+def main():
+    import itertools
+    from binance import Client
+    from kline_store import KlineStore
+    from indicator_cache import IndicatorCache
+    from pipeline import TREND_INDICATORS
+    from signals import trend_signals
+
+    store = KlineStore(client=Client())
+    k_lines = store.load("BTCUSDT", Client.KLINE_INTERVAL_1MINUTE, "2 years ago UTC", "now UTC")
+    k_lines = IndicatorCache().add("BTCUSDT", Client.KLINE_INTERVAL_1MINUTE, k_lines, TREND_INDICATORS)
+    k_lines['symbol'] = "BTCUSDT"
+
+    # 30 days to pick the RSI thresholds, the next 7 days to test them
+    param_sets = [{'rsi_buy': buy, 'rsi_sell': sell} for buy, sell in itertools.product([25, 30, 35], [65, 70, 75])]
+    table = walk_forward(k_lines, trend_signals, train=30 * 1440, test=7 * 1440, param_sets=param_sets)
+    print(table.to_string())
+    print(stability(table).to_string())
+
+
+if __name__ == "__main__":
+    main()